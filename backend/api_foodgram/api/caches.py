@@ -0,0 +1,180 @@
+import re
+import time
+from bisect import bisect_left
+from hashlib import md5
+from itertools import islice
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from recipes.models import Ingredient, IngredientWithWT, Recipe, Tag
+
+from .replicas import is_replica_stale
+
+VERSION_KEY = 'version:{}'
+RECIPE_LIST_KEY = 'recipe_list:{}'
+RECIPE_LIST_METRIC_KEY = 'recipe_list_cache:{}'
+RECIPE_LIST_METRICS = ('hits', 'misses', 'evictions')
+RECIPE_LIST_PARAMS = ('page', 'limit', 'tags', 'tags_mode', 'author')
+RECIPE_LIST_MODELS = (Recipe, IngredientWithWT, Ingredient, Tag)
+
+
+def get_version(model):
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(model):
+    cache.set(VERSION_KEY.format(model._meta.label_lower), time.time(), None)
+
+
+def get_trigrams(value):
+    trigrams = set()
+    for word in re.findall(r'[^\W_]+', value.lower()):
+        word = f'  {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+def get_similarity(trigrams, value):
+    other = get_trigrams(value)
+    common = len(trigrams & other)
+    total = len(trigrams) + len(other) - common
+    return common / total if total else 0
+
+
+class IngredientIndex:
+    def __init__(self, ingredients, trigram=False):
+        self.all = list(ingredients)
+        self.trigram = trigram
+        self.items = sorted(
+            self.all,
+            key=lambda item: (item['name'].upper(), item['name'])
+        )
+        self.keys = [item['name'].upper() for item in self.items]
+
+    def search(self, value):
+        if not value:
+            return self.all
+        query = value.upper()
+        exact, prefix = [], []
+        start = bisect_left(self.keys, query)
+        for key, item in zip(islice(self.keys, start, None),
+                             islice(self.items, start, None)):
+            if not key.startswith(query):
+                break
+            if key == query:
+                exact.append(item)
+            else:
+                prefix.append(item)
+        contains = [
+            item for key, item in zip(self.keys, self.items)
+            if query in key and not key.startswith(query)
+        ]
+        return [
+            item for group in (exact, prefix, contains)
+            for item in sorted(group, key=self.get_sort_key(value))
+        ]
+
+    def get_sort_key(self, value):
+        if not self.trigram:
+            return lambda item: item['name']
+        trigrams = get_trigrams(value)
+        return lambda item: (
+            -get_similarity(trigrams, item['name']), item['name']
+        )
+
+
+_ingredient_index = None
+_ingredient_index_version = None
+
+
+def get_ingredient_index():
+    global _ingredient_index, _ingredient_index_version
+    version = get_version(Ingredient)
+    if _ingredient_index is None or _ingredient_index_version != version:
+        _ingredient_index = IngredientIndex(
+            Ingredient.objects.order_by('pk').values(
+                'id', 'name', 'measurement_unit'
+            ),
+            trigram=connection.vendor == 'postgresql'
+        )
+        _ingredient_index_version = (
+            None if is_replica_stale(version) else version
+        )
+    return _ingredient_index
+
+
+_tag_ids = None
+_tag_ids_version = None
+
+
+def get_tag_ids():
+    global _tag_ids, _tag_ids_version
+    if not settings.SHARED_CACHE:
+        return dict(Tag.objects.values_list('slug', 'id'))
+    version = get_version(Tag)
+    if _tag_ids is None or _tag_ids_version != version:
+        _tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_ids_version = None if is_replica_stale(version) else version
+    return _tag_ids
+
+
+def get_recipe_list_cache_key(request):
+    query_params = request.query_params
+    if not settings.RECIPE_LIST_CACHE_TIMEOUT:
+        return None
+    if any(param not in RECIPE_LIST_PARAMS for param in query_params):
+        return None
+    normalized = request.build_absolute_uri('/') + urlencode(sorted(
+        (param, sorted(set(query_params.getlist(param))))
+        for param in query_params
+    ), doseq=True)
+    return RECIPE_LIST_KEY.format(md5(normalized.encode()).hexdigest())
+
+
+def get_cached_recipe_list(key):
+    versions = [get_version(model) for model in RECIPE_LIST_MODELS]
+    entry = cache.get(key)
+    if entry is not None and entry['versions'] == versions:
+        count_recipe_list_metric('hits')
+        return entry['data'], versions
+    if entry is not None:
+        count_recipe_list_metric('evictions')
+    count_recipe_list_metric('misses')
+    return None, versions
+
+
+def set_cached_recipe_list(key, data, versions):
+    if is_replica_stale(max(versions)):
+        return
+    cache.set(
+        key, {'versions': versions, 'data': data},
+        settings.RECIPE_LIST_CACHE_TIMEOUT
+    )
+
+
+def count_recipe_list_metric(name):
+    key = RECIPE_LIST_METRIC_KEY.format(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_recipe_list_metrics():
+    values = cache.get_many(
+        [RECIPE_LIST_METRIC_KEY.format(name) for name in RECIPE_LIST_METRICS]
+    )
+    return {
+        name: values.get(RECIPE_LIST_METRIC_KEY.format(name), 0)
+        for name in RECIPE_LIST_METRICS
+    }
@@ -1,14 +1,28 @@
-from django.db.models import Case, IntegerField, Q, Value, When
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Q, Value,
+                              When)
+from django.utils.functional import cached_property
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+
+from .caches import get_tag_ids
+
+TAGS_MODE_CHOICES = (
+    ('any', 'Любой из тегов'),
+    ('all', 'Все теги'),
+)
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        method='get_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODE_CHOICES,
+        method='get_tags_mode',
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
@@ -22,7 +36,42 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'is_in_shopping_cart', 'is_favorited', 'author')
+        fields = (
+            'tags', 'tags_mode', 'is_in_shopping_cart', 'is_favorited',
+            'author'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'tags' in self.data:
+            self.filters['tags'].extra['choices'] = [
+                (slug, slug) for slug in self.tag_ids
+            ]
+
+    @cached_property
+    def tag_ids(self):
+        return get_tag_ids()
+
+    def get_tags(self, queryset, name, value):
+        tag_ids = self.tag_ids
+        ids = {tag_ids[slug] for slug in value if slug in tag_ids}
+        if not ids:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') != 'all':
+            return queryset.annotate(
+                has_tags=Exists(recipe_tags.filter(tag_id__in=ids))
+            ).filter(has_tags=True)
+        for tag_id in ids:
+            queryset = queryset.annotate(**{
+                f'has_tag_{tag_id}': Exists(recipe_tags.filter(tag_id=tag_id))
+            }).filter(**{f'has_tag_{tag_id}': True})
+        return queryset
+
+    def get_tags_mode(self, queryset, name, value):
+        return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value:
@@ -40,6 +89,19 @@ class RecipeFilter(FilterSet):
         return queryset
 
 
+class RecipeOrderingFilter(OrderingFilter):
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        fields = {field.lstrip('-') for field in ordering}
+        return [*ordering, *(
+            field for field in Recipe._meta.ordering
+            if field.lstrip('-') not in fields
+        )]
+
+
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(
         method='get_ordered_and_filtered_queryset'
@@ -59,5 +121,10 @@ class IngredientFilter(FilterSet):
                     default=Value(0),
                     output_field=IntegerField()
                 )
-            ).order_by('-filter_flag', 'name')
+            )
+            if connections[queryset.db].vendor == 'postgresql':
+                return queryset.annotate(
+                    similarity=TrigramSimilarity('name', value)
+                ).order_by('-filter_flag', '-similarity', 'name')
+            queryset = queryset.order_by('-filter_flag', 'name')
         return queryset
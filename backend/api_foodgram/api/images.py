@@ -0,0 +1,163 @@
+import base64
+import binascii
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from recipes.models import Recipe
+
+from .caches import bump_version
+
+DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+}
+THUMBNAILS_DIR = 'thumbnails'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def decode_base64_image(data):
+    header, _, encoded = data.partition(';base64,')
+    if not encoded or not header.startswith('data:image/'):
+        raise serializers.ValidationError('Некорректное изображение')
+    if len(encoded) * 3 // 4 > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения превышает допустимый'
+        )
+    file = SpooledTemporaryFile(max_size=DECODE_CHUNK_SIZE * 16)
+    step = DECODE_CHUNK_SIZE // 3 * 4
+    try:
+        for start in range(0, len(encoded), step):
+            file.write(base64.b64decode(
+                encoded[start:start + step], validate=True
+            ))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise serializers.ValidationError('Некорректное изображение')
+    file.seek(0)
+    return File(file, name='temp.' + header[len('data:image/'):])
+
+
+def get_thumbnail_name(name, size):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    extension = IMAGE_EXTENSIONS[settings.IMAGE_FORMAT]
+    return os.path.join(
+        directory, THUMBNAILS_DIR, f'{stem}_{size}.{extension}'
+    )
+
+
+def get_image_urls(recipe, request=None):
+    if not recipe.image:
+        return None
+    urls = {}
+    for size in settings.IMAGE_THUMBNAIL_SIZES:
+        url = recipe.image.url
+        if recipe.image_ready:
+            url = default_storage.url(
+                get_thumbnail_name(recipe.image.name, size)
+            )
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls[size] = url
+    return urls
+
+
+def encode_image(image, side):
+    image = image.copy()
+    image.thumbnail((side, side), Image.LANCZOS)
+    if settings.IMAGE_FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(
+        buffer, format=settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def get_processed_name(name):
+    stem = os.path.splitext(name)[0]
+    extension = IMAGE_EXTENSIONS[settings.IMAGE_FORMAT]
+    return f'{stem}_{settings.IMAGE_MAX_SIDE}.{extension}'
+
+
+def is_same_image(current, upload):
+    if not current:
+        return False
+    name = default_storage.get_content_name(
+        current.field.generate_filename(current.instance, upload.name),
+        upload
+    )
+    return current.name in (name, get_processed_name(name))
+
+
+def process_recipe_image(recipe_id, name):
+    processed = get_processed_name(name)
+    targets = [(processed, settings.IMAGE_MAX_SIDE)] + [
+        (get_thumbnail_name(processed, size), side)
+        for size, side in settings.IMAGE_THUMBNAIL_SIZES.items()
+    ]
+    missing = [
+        (target, side) for target, side in targets
+        if not default_storage.touch(target)
+    ]
+    if missing:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            for target, side in missing:
+                default_storage.save_as(target, encode_image(image, side))
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image=processed, image_ready=True
+    )
+    if updated:
+        bump_version(Recipe)
+
+
+def run_image_worker(recipe_id, name):
+    try:
+        process_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='images'
+        )
+    return _executor
+
+
+def schedule_recipe_image(recipe):
+    if not recipe.image or recipe.image_ready:
+        return
+    recipe_id, name = recipe.pk, recipe.image.name
+    if not settings.IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe_id, name)
+        )
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_image_worker, recipe_id, name)
+    )
@@ -0,0 +1,583 @@
+import base64
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.metrics import RequestMetrics, track_queries
+from api.paginators import PageNumberPagination
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.services import recount_recipe_counter, refresh_popularity
+from recipes.models import (Favorite, Ingredient, IngredientWithWT,
+                            PopularityState, Recipe, RecipePopularity,
+                            ShoppingCart, Subscriptions, Tag)
+
+User = get_user_model()
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks/baseline.json')
+INGREDIENTS_PATH = os.path.join(settings.BASE_DIR, 'data/ingredients.csv')
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+DEEP_PAGE = 10000
+EDITED_INGREDIENTS = 50
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def get_percentile(values, quantile):
+    values = sorted(values)
+    return values[min(int(quantile * len(values)), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark API hot paths on a seeded dataset. '
+            'Creates and destroys a test database.')
+
+    def add_arguments(self, parser):
+        self.add_seed_arguments(parser)
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Количество запросов в каждом сценарии'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Количество прогревочных запросов в каждом сценарии'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии'
+        )
+        parser.add_argument(
+            '--job', action='append', dest='jobs', default=[],
+            help=('Запустить фоновую задачу: ingredient_import, '
+                  'ingredient_import_copy, trending_refresh '
+                  '(по умолчанию задачи не запускаются)')
+        )
+        parser.add_argument(
+            '--import-rows', type=int, default=1000000,
+            help='Количество строк в задаче импорта ингредиентов'
+        )
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help='Не отключать кэш списка рецептов'
+        )
+        parser.add_argument(
+            '--baseline', default=DEFAULT_BASELINE,
+            help='JSON с базовыми результатами для сравнения'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результаты как базовые'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое ухудшение p95 относительно базовых результатов'
+        )
+
+    def add_seed_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов'
+        )
+        parser.add_argument(
+            '--extra-ingredients', type=int, default=0,
+            help='Добавить синтетические ингредиенты к справочнику'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Количество ингредиентов в рецепте'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у каждого пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в корзине у каждого пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Подписок у каждого пользователя'
+        )
+        parser.add_argument(
+            '--large-cart', type=int, default=500,
+            help='Рецептов в корзине у отдельного пользователя'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=20,
+            help='Количество пользователей, от имени которых идут запросы'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        scenarios, jobs = self.get_scenarios(), self.get_jobs()
+        selected = options['scenarios']
+        if selected is None:
+            selected = [] if options['jobs'] else list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        unknown = set(options['jobs']) - set(jobs)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные задачи: {", ".join(sorted(unknown))}'
+            )
+        with self.seeded_database(options, RECIPE_LIST_CACHE_TIMEOUT=(
+            settings.RECIPE_LIST_CACHE_TIMEOUT
+            if options['with_cache'] else 0
+        )):
+            results = {
+                name: self.run_scenario(
+                    scenarios[name], options['requests'], options['warmup']
+                )
+                for name in selected
+            }
+            job_results = {
+                name: self.run_job(jobs[name], options)
+                for name in options['jobs']
+            }
+        self.report(results)
+        self.report_jobs(job_results)
+        if options['save_baseline']:
+            self.save_baseline(options['baseline'], results)
+            return
+        if os.path.exists(options['baseline']):
+            self.compare(options['baseline'], results, options['tolerance'])
+
+    @contextmanager
+    def seeded_database(self, options, **overrides):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root,
+                    IMAGE_WORKERS=0,
+                    METRICS_SAMPLE_RATE=0,
+                    DATABASE_REPLICAS=[],
+                    **overrides
+                ):
+                    self.seed(options)
+                    yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, options):
+        started = time.monotonic()
+        call_command(
+            'load_ingredient_data', INGREDIENTS_PATH, batch_size=5000,
+            stdout=io.StringIO()
+        )
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)
+        )
+        self.seed_ingredients(options['extra_ingredients'])
+        password = make_password('benchmark')
+        User.objects.bulk_create([
+            User(
+                username=f'user{index}', email=f'user{index}@example.com',
+                first_name='Имя', last_name='Фамилия', password=password
+            )
+            for index in range(options['users'])
+        ])
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS
+        ]
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=user_ids[index % len(user_ids)],
+                name=f'Рецепт {index}', text='Описание рецепта',
+                cooking_time=self.random.randint(5, 120),
+                image='images/benchmark.png'
+            )
+            for index in range(options['recipes'])
+        ))
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.pk)
+            for recipe_id in recipe_ids
+            for tag in self.random.sample(tags, self.random.randint(1, 2))
+        ))
+        self.bulk_create(IngredientWithWT, (
+            IngredientWithWT(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids, options['ingredients_per_recipe']
+            )
+        ))
+        for model, per_user in ((Favorite, options['favorites']),
+                                (ShoppingCart, options['carts'])):
+            rows = [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.random.sample(recipe_ids, per_user)
+            ]
+            self.bulk_create(model, rows)
+            recount_recipe_counter(model, list({
+                row.recipe_id for row in rows
+            }))
+            model.objects.update(created=F('created') - timedelta(hours=1))
+        self.bulk_create(Subscriptions, (
+            Subscriptions(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.random.sample(
+                user_ids, options['subscriptions']
+            )
+            if author_id != user_id
+        ))
+        self.clients = []
+        for user in User.objects.order_by('pk')[:options['clients']]:
+            token = Token.objects.create(user=user)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            own_recipes = list(
+                Recipe.objects.filter(author=user).values_list(
+                    'pk', flat=True
+                )[:10]
+            )
+            self.clients.append((client, own_recipes))
+        refresh_popularity()
+        self.large_cart_client = self.seed_large_cart(
+            recipe_ids, options['large_cart']
+        )
+        self.anonymous = APIClient()
+        self.tags = [tag.pk for tag in tags]
+        self.user_ids = user_ids
+        self.recipe_ids = recipe_ids
+        self.ingredient_ids = ingredient_ids
+        self.edited_recipes = {}
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), '#E26C2D').save(image, format='PNG')
+        self.image = 'data:image/png;base64,' + base64.b64encode(
+            image.getvalue()
+        ).decode()
+        self.stdout.write(
+            f'Данные созданы за {time.monotonic() - started:.1f} с: '
+            f'{len(user_ids)} пользователей, {len(recipe_ids)} рецептов'
+        )
+
+    def bulk_create(self, model, objects, batch_size=10000):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+    def seed_ingredients(self, size):
+        self.bulk_create(Ingredient, (
+            Ingredient(
+                name=f'{self.random.choice(self.ingredient_names)} {index}',
+                measurement_unit='г'
+            )
+            for index in range(size)
+        ))
+
+    def seed_large_cart(self, recipe_ids, size):
+        user = User.objects.create(
+            username='large_cart', email='large_cart@example.com',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cart = self.random.sample(recipe_ids, min(size, len(recipe_ids)))
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=user, recipe_id=recipe_id) for recipe_id in cart
+        ])
+        recount_recipe_counter(ShoppingCart, cart)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}'
+        )
+        return client
+
+    def get_client(self):
+        return self.random.choice(self.clients)[0]
+
+    def get_recipe_body(self):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание рецепта',
+            'cooking_time': self.random.randint(5, 120),
+            'image': self.image,
+            'tags': self.random.sample(self.tags, 2),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': self.random.randint(1, 500)}
+                for ingredient_id in self.random.sample(self.ingredient_ids, 8)
+            ],
+        }
+
+    def get_scenarios(self):
+        return {
+            'recipe_list': lambda: self.anonymous.get(
+                f'/api/recipes/?page={self.random.randint(1, 20)}'
+            ),
+            'recipe_list_first_page': lambda: self.anonymous.get(
+                '/api/recipes/?page=1'
+            ),
+            'recipe_list_deep_page': lambda: self.anonymous.get(
+                f'/api/recipes/?page={self.get_deep_page()}'
+            ),
+            'recipe_list_tags': lambda: self.anonymous.get(
+                '/api/recipes/?tags=breakfast&tags=lunch'
+            ),
+            'recipe_list_author': lambda: self.anonymous.get(
+                f'/api/recipes/?author={self.random.choice(self.user_ids)}'
+            ),
+            'recipe_list_favorited': lambda: self.get_client().get(
+                '/api/recipes/?is_favorited=1'
+            ),
+            'recipe_list_in_cart': lambda: self.get_client().get(
+                '/api/recipes/?is_in_shopping_cart=1'
+            ),
+            'trending': lambda: self.anonymous.get('/api/recipes/trending/'),
+            'recipe_retrieve': lambda: self.get_client().get(
+                f'/api/recipes/{self.random.choice(self.recipe_ids)}/'
+            ),
+            'ingredient_search': lambda: self.anonymous.get(
+                '/api/ingredients/', self.get_ingredient_query()
+            ),
+            'ingredient_search_index': self.search_ingredient_index,
+            'subscriptions': lambda: self.get_client().get(
+                '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'download_shopping_cart': lambda: self.get_client().get(
+                '/api/recipes/download_shopping_cart/'
+            ),
+            **{
+                f'download_large_cart_{renderer.format}': (
+                    lambda format=renderer.format: self.large_cart_client.get(
+                        '/api/recipes/download_shopping_cart/',
+                        {'format': format}
+                    )
+                )
+                for renderer in SHOPPING_LIST_RENDERERS
+            },
+            'recipe_create': lambda: self.get_client().post(
+                '/api/recipes/', self.get_recipe_body(), format='json'
+            ),
+            'recipe_update': self.update_recipe,
+            'recipe_update_ingredients': self.update_recipe_ingredients,
+        }
+
+    def get_deep_page(self):
+        pages = -(-len(self.recipe_ids) // PageNumberPagination.page_size)
+        return max(1, min(DEEP_PAGE, pages))
+
+    def get_ingredient_query(self):
+        return {'name': self.random.choice(self.ingredient_names)[:3]}
+
+    def search_ingredient_index(self):
+        with override_settings(INGREDIENT_SEARCH_INDEX=True):
+            return self.anonymous.get(
+                '/api/ingredients/', self.get_ingredient_query()
+            )
+
+    def get_jobs(self):
+        jobs = {
+            'ingredient_import': self.import_ingredients,
+            'trending_refresh': self.rebuild_popularity,
+        }
+        if connection.vendor == 'postgresql':
+            jobs['ingredient_import_copy'] = partial(
+                self.import_ingredients, copy=True
+            )
+        return jobs
+
+    def rebuild_popularity(self, options):
+        PopularityState.objects.all().delete()
+        RecipePopularity.objects.all().delete()
+        started = time.perf_counter()
+        events, _ = refresh_popularity()
+        return events, time.perf_counter() - started
+
+    def import_ingredients(self, options, copy=False):
+        rows = options['import_rows']
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', newline=''
+        ) as file:
+            csv.writer(file).writerows(
+                (f'Импорт {"copy" if copy else "insert"} {index}', 'г')
+                for index in range(rows)
+            )
+            file.flush()
+            started = time.perf_counter()
+            call_command(
+                'load_ingredient_data', file.name, batch_size=5000,
+                copy=copy, stdout=io.StringIO()
+            )
+            return rows, time.perf_counter() - started
+
+    def update_recipe(self):
+        client, own_recipes = self.random.choice(self.clients)
+        return client.patch(
+            f'/api/recipes/{self.random.choice(own_recipes)}/',
+            self.get_recipe_body(), format='json'
+        )
+
+    def update_recipe_ingredients(self):
+        client, own_recipes = self.random.choice(self.clients)
+        recipe_id = own_recipes[0]
+        amounts = self.edited_recipes.setdefault(recipe_id, dict.fromkeys(
+            self.random.sample(self.ingredient_ids, EDITED_INGREDIENTS), 1
+        ))
+        for ingredient_id in self.random.sample(list(amounts), 5):
+            amounts[ingredient_id] += 1
+        return client.patch(f'/api/recipes/{recipe_id}/', {'ingredients': [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+        ]}, format='json')
+
+    def run_scenario(self, request, count, warmup):
+        for _ in range(warmup):
+            self.send(request)
+        latencies, queries, written = [], [], []
+        started = time.perf_counter()
+        for _ in range(count):
+            latency, query_count, rows = self.send(request)
+            latencies.append(latency)
+            queries.append(query_count)
+            written.append(rows)
+        elapsed = time.perf_counter() - started
+        result = {'rps': round(count / elapsed, 1)}
+        for name, quantile in QUANTILES:
+            result[name] = round(get_percentile(latencies, quantile) * 1000, 2)
+        result['queries'] = max(queries)
+        result['rows_written'] = get_percentile(written, 0.5)
+        result['peak_kb'] = self.measure_memory(request)
+        return result
+
+    def run_job(self, job, options):
+        rows, elapsed = job(options)
+        return {
+            'rows': rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(rows / elapsed) if elapsed else None,
+        }
+
+    def measure_memory(self, request):
+        tracemalloc.start()
+        try:
+            self.send(request)
+            return round(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+    def send(self, request):
+        metrics, written = RequestMetrics(), []
+
+        def count_rows(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+                written.append(max(context['cursor'].rowcount, 0))
+            return result
+
+        started = time.perf_counter()
+        with track_queries(metrics), connection.execute_wrapper(count_rows):
+            response = request()
+            b''.join(getattr(response, 'streaming_content', ()))
+        latency = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{response.request["PATH_INFO"]} вернул '
+                f'{response.status_code}'
+            )
+        return latency, sum(metrics.queries.values()), sum(written)
+
+    def report(self, results):
+        if not results:
+            return
+        self.stdout.write(
+            f'{"сценарий":<28}{"rps":>8}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросов":>10}{"строк записано":>16}{"память, КБ":>12}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28}{result["rps"]:>8}{result["p50"]:>9}'
+                f'{result["p95"]:>9}{result["p99"]:>9}{result["queries"]:>10}'
+                f'{result["rows_written"]:>16}{result["peak_kb"]:>12}'
+            )
+
+    def report_jobs(self, results):
+        if not results:
+            return
+        self.stdout.write(
+            f'{"задача":<28}{"строк":>10}{"секунд":>10}{"строк/с":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28}{result["rows"]:>10}{result["seconds"]:>10}'
+                f'{result["rows_per_second"]!s:>10}'
+            )
+
+    def save_baseline(self, path, results):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write('\n')
+        self.stdout.write(f'Базовые результаты сохранены в {path}')
+
+    def compare(self, path, results, tolerance):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['p95'] > expected['p95'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {result["p95"]} мс, '
+                    f'базовое {expected["p95"]} мс'
+                )
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: {result["queries"]} запросов, '
+                    f'базовое {expected["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Производительность ухудшилась:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write('Регрессий относительно базовых результатов нет')
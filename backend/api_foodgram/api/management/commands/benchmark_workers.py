@@ -0,0 +1,238 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from . import benchmark
+
+MODES = (('sync', 'False'), ('asgi', 'True'))
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    return status, headers.get('connection') != 'close'
+
+
+class Command(benchmark.Command):
+    help = ('Compare sync and ASGI gunicorn workers under concurrent load. '
+            'Creates and destroys a test database, PostgreSQL only.')
+
+    def add_arguments(self, parser):
+        self.add_seed_arguments(parser)
+        parser.add_argument(
+            '--connections', type=int, default=200,
+            help='Количество одновременных соединений'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность каждого сценария в секундах'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество процессов gunicorn'
+        )
+        parser.add_argument(
+            '--port', type=int, default=8001,
+            help='Порт, на котором запускается gunicorn'
+        )
+        parser.add_argument(
+            '--mode', action='append', dest='modes',
+            choices=[mode for mode, _ in MODES],
+            help='Запустить только указанные режимы'
+        )
+        parser.add_argument(
+            '--conn-max-age', action='append', type=int,
+            dest='conn_max_ages',
+            help='Сравнить указанные значения DB_CONN_MAX_AGE'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Сравнение воркеров требует PostgreSQL')
+        self.random = random.Random(options['seed'])
+        scenarios = self.get_scenarios()
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        modes = options['modes'] or [mode for mode, _ in MODES]
+        results = {}
+        with self.seeded_database(options):
+            self.tokens = list(Token.objects.values_list('key', flat=True))
+            for mode, asgi in MODES:
+                if mode not in modes:
+                    continue
+                for conn_max_age in options['conn_max_ages'] or [None]:
+                    with self.server(asgi, conn_max_age, options):
+                        for name in selected:
+                            results[mode, conn_max_age, name] = asyncio.run(
+                                self.run_load(
+                                    scenarios[name], options['port'],
+                                    options['connections'],
+                                    options['duration']
+                                )
+                            )
+        self.report(results)
+
+    def get_scenarios(self):
+        return {
+            'tags': lambda: ('/api/tags/', None),
+            'ingredient_search': lambda: (
+                '/api/ingredients/?name=' + self.random.choice(
+                    self.ingredient_names
+                )[:3], None
+            ),
+            'recipe_list': lambda: (
+                f'/api/recipes/?page={self.random.randint(1, 20)}', None
+            ),
+            'recipe_retrieve': lambda: (
+                f'/api/recipes/{self.random.choice(self.recipe_ids)}/',
+                self.random.choice(self.tokens)
+            ),
+            'download_shopping_cart': lambda: (
+                '/api/recipes/download_shopping_cart/',
+                self.random.choice(self.tokens)
+            ),
+        }
+
+    @contextmanager
+    def server(self, asgi, conn_max_age, options):
+        env = dict(
+            os.environ, ASGI=asgi, DEBUG='False',
+            DB_NAME=connection.settings_dict['NAME'],
+            DJANGO_ALLOWED_HOSTS='127.0.0.1', METRICS_SAMPLE_RATE='0',
+            RECIPE_LIST_CACHE_TIMEOUT='0', DB_REPLICA_HOSTS='',
+            GUNICORN_WORKERS=str(
+                options['workers']
+            )
+        )
+        if conn_max_age is not None:
+            env['DB_CONN_MAX_AGE'] = str(conn_max_age)
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                '--config', 'gunicorn.conf.py',
+                '--bind', f'127.0.0.1:{options["port"]}',
+                '--backlog', str(max(options['connections'] * 2, 2048)),
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=env
+        )
+        try:
+            self.wait_for_port(process, options['port'])
+            yield process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def wait_for_port(self, process, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('gunicorn не запустился за отведённое время')
+
+    async def run_load(self, request, port, connections, duration):
+        self.latencies, self.errors = [], 0
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.run_connection(request, port, started + duration)
+            for _ in range(connections)
+        ))
+        elapsed = time.perf_counter() - started
+        result = {
+            'rps': round(len(self.latencies) / elapsed, 1),
+            'errors': self.errors,
+        }
+        for name, quantile in benchmark.QUANTILES:
+            result[name] = round(benchmark.get_percentile(
+                self.latencies, quantile
+            ) * 1000, 1) if self.latencies else None
+        return result
+
+    async def run_connection(self, request, port, deadline):
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if writer is None:
+                try:
+                    reader, writer = await asyncio.open_connection(
+                        '127.0.0.1', port
+                    )
+                except OSError:
+                    self.errors += 1
+                    continue
+            path, token = request()
+            if not await self.send_request(reader, writer, path, token,
+                                           started):
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    async def send_request(self, reader, writer, path, token, started):
+        headers = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+        if token:
+            headers += f'Authorization: Token {token}\r\n'
+        try:
+            writer.write(f'{headers}\r\n'.encode())
+            status, keep_alive = await read_response(reader)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            self.errors += 1
+            return False
+        if status >= 400:
+            self.errors += 1
+        else:
+            self.latencies.append(time.perf_counter() - started)
+        return keep_alive
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"режим":<6}{"max_age":>8} {"сценарий":<24}{"rps":>8}'
+            f'{"p50":>9}{"p95":>9}{"p99":>9}{"ошибок":>8}'
+        )
+        for (mode, conn_max_age, name), result in results.items():
+            conn_max_age = '-' if conn_max_age is None else conn_max_age
+            self.stdout.write(
+                f'{mode:<6}{conn_max_age:>8} {name:<24}{result["rps"]:>8}'
+                f'{result["p50"]!s:>9}{result["p95"]!s:>9}'
+                f'{result["p99"]!s:>9}{result["errors"]:>8}'
+            )
@@ -0,0 +1,249 @@
+import json
+import random
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, IngredientWithWT, Recipe,
+                            ShoppingCart, Subscriptions, Tag)
+
+User = get_user_model()
+
+LARGE_TABLES = (
+    Recipe._meta.db_table,
+    Recipe.tags.through._meta.db_table,
+    IngredientWithWT._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+    Subscriptions._meta.db_table,
+)
+
+ENDPOINTS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=10&page=1',
+    '/api/recipes/?cursor=',
+    '/api/recipes/?tags=breakfast',
+    '/api/recipes/?tags=breakfast&tags=lunch',
+    '/api/recipes/?tags=breakfast&tags=lunch&tags_mode=all',
+    '/api/recipes/?ordering=-favorites_count',
+    '/api/recipes/?author={author}',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/?is_favorited=1&tags=breakfast&author={author}',
+    '/api/recipes/trending/',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/users/subscriptions/',
+    '/api/users/subscriptions/?recipes_limit=3',
+)
+
+INDEX_ENDPOINTS = (
+    ('recipe_pub_date_id_idx', '/api/recipes/?limit=10&cursor='),
+    ('recipe_author_pub_date_idx',
+     '/api/recipes/?limit=10&cursor=&author={author}'),
+    ('recipe_favorites_count_idx',
+     '/api/recipes/?limit=10&ordering=-favorites_count'),
+)
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan')
+JOINS = ('Nested Loop', 'Hash Join', 'Merge Join')
+SUBPLAN_FILTER = re.compile(r'(hashed )?SubPlan \d+|AND|OR|NOT|[()\s]')
+
+
+def find_full_scans(plan, under_limit=False, in_join=False):
+    node_type = plan.get('Node Type')
+    if plan.get('Relation Name') in LARGE_TABLES:
+        full_index_scan = (
+            node_type in INDEX_SCANS and 'Index Cond' not in plan
+        )
+        row_filter = plan.get('Filter')
+        if row_filter and not SUBPLAN_FILTER.sub('', row_filter):
+            row_filter = None
+        if node_type == 'Seq Scan':
+            yield plan['Relation Name']
+        elif full_index_scan and row_filter:
+            yield plan['Relation Name']
+        elif full_index_scan and in_join and not under_limit:
+            yield plan['Relation Name']
+    under_limit = under_limit or node_type == 'Limit'
+    in_join = in_join or node_type in JOINS
+    for child in plan.get('Plans', ()):
+        yield from find_full_scans(child, under_limit, in_join)
+
+
+class Command(BaseCommand):
+    help = ('Check that API queries on large tables are served by indexes. '
+            'Creates and destroys a test database on PostgreSQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compare-indexes', action='store_true',
+            help='Сравнить планы запросов с индексами рецептов и без них'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=50000,
+            help='Количество рецептов для сравнения индексов'
+        )
+        parser.add_argument(
+            '--authors', type=int, default=500,
+            help='Количество авторов для сравнения индексов'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Проверка планов доступна только для PostgreSQL'
+            )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            with override_settings(
+                RECIPE_LIST_CACHE_TIMEOUT=0, DATABASE_REPLICAS=[]
+            ):
+                seed = self.seed()
+                if options['compare_indexes']:
+                    seed[1]['author'] = self.seed_recipes(
+                        options['recipes'], options['authors']
+                    )
+                    self.compare_indexes(seed)
+                failures = self.check_plans(seed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError(
+                f'Полное сканирование таблиц в {failures} запросах'
+            )
+        self.stdout.write('Все планы используют индексы')
+
+    def seed(self):
+        user = User.objects.create_user(
+            username='plans', email='plans@example.com', password='plans'
+        )
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='plans'
+        )
+        tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='plans', text='plans', cooking_time=1
+        )
+        recipe.tags.set(tags)
+        IngredientWithWT.objects.create(recipe=recipe, ingredient=ingredient)
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        Subscriptions.objects.create(user=user, author=author)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}'
+        )
+        return client, {'author': author.id, 'recipe': recipe.id}
+
+    def seed_recipes(self, size, authors):
+        generator = random.Random(0)
+        User.objects.bulk_create(
+            User(
+                username=f'author{index}', email=f'author{index}@example.com'
+            )
+            for index in range(authors)
+        )
+        author_ids = list(User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        Recipe.objects.bulk_create((
+            Recipe(
+                author_id=generator.choice(author_ids), name=f'plans {index}',
+                text='plans', cooking_time=1,
+                favorites_count=generator.randint(0, 1000)
+            )
+            for index in range(size)
+        ), batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+        return author_ids[-1]
+
+    def compare_indexes(self, seed):
+        client, context = seed
+        self.stdout.write(
+            f'{"индекс":<30}{"стоимость":>24}{"время, мс":>18}'
+        )
+        for index, endpoint in INDEX_ENDPOINTS:
+            url = endpoint.format(**context)
+            for sql in self.capture(client, url):
+                with_index = self.analyze(sql)
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f'DROP INDEX {connection.ops.quote_name(index)}'
+                        )
+                    without_index = self.analyze(sql)
+                    transaction.set_rollback(True)
+                cost = with_index['Plan']['Total Cost']
+                old_cost = without_index['Plan']['Total Cost']
+                if cost == old_cost:
+                    continue
+                self.stdout.write(
+                    f'{index:<30}{old_cost:>12.1f} -> {cost:<8.1f}'
+                    f'{without_index["Execution Time"]:>8.2f} -> '
+                    f'{with_index["Execution Time"]:.2f}\n    {url}'
+                )
+
+    def capture(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            b''.join(getattr(response, 'streaming_content', ()))
+        if response.status_code != 200:
+            raise CommandError(f'{url} вернул {response.status_code}')
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+
+    def analyze(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    def check_plans(self, seed):
+        client, context = seed
+        failures = 0
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        for endpoint in ENDPOINTS:
+            url = endpoint.format(**context)
+            queries = self.capture(client, url)
+            for sql in queries:
+                tables = sorted(set(self.explain(sql)))
+                if tables:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{url}: полное сканирование {", ".join(tables)}\n'
+                        f'    {sql}'
+                    ))
+            self.stdout.write(f'{url}: {len(queries)} запросов проверено')
+        return failures
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return find_full_scans(plan[0]['Plan'])
@@ -0,0 +1,65 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.images import get_processed_name, get_thumbnail_name
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe images that no recipe references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не удалять файлы, изменённые за последние N часов'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options['grace_hours'] * 3600
+        referenced = self.get_referenced_names()
+        upload_to = Recipe._meta.get_field('image').upload_to
+        root = default_storage.path(upload_to)
+        removed, freed = 0, 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location)
+                if name in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    if not options['dry_run']:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{action} {removed} файлов ({freed / 1024 / 1024:.1f} МБ)'
+        )
+
+    def get_referenced_names(self):
+        referenced = set()
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        )
+        for name in names.iterator():
+            processed = get_processed_name(name)
+            for image in (name, processed):
+                referenced.add(image)
+                referenced.update(
+                    get_thumbnail_name(image, size)
+                    for size in settings.IMAGE_THUMBNAIL_SIZES
+                )
+        return referenced
@@ -1,22 +1,168 @@
 import csv
+import io
+import json
 import os
+import re
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.caches import bump_version
 from api_foodgram.settings import BASE_DIR
 from recipes.models import Ingredient
 
+DEFAULT_PATHS = (
+    os.path.join(BASE_DIR, 'data/ingredients.csv'),
+    os.path.join(BASE_DIR, 'data/ingredients.json'),
+)
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        yield row[0], row[1]
+
+
+def read_json(file, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip().lstrip('[')
+    index = 0
+    while True:
+        index = JSON_SEPARATORS.match(buffer, index).end()
+        if buffer.startswith(']', index):
+            return
+        try:
+            item, index = decoder.raw_decode(buffer, index)
+        except ValueError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError(f'Некорректный JSON в {file.name}')
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
     help = "Load ingredients to DB"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=DEFAULT_PATHS,
+            help='CSV или JSON файлы с ингредиентами'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Прочитать файлы без записи в базу данных'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузить через COPY (только PostgreSQL)'
+        )
+
     def handle(self, *args, **options):
-        path = os.path.join(BASE_DIR, 'data/ingredients.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL')
+        batch_size = options['batch_size']
+        write = self.write_batch
+        if options['copy']:
+            write = self.copy_batch
+        if options['dry_run']:
+            write = None
+        before = Ingredient.objects.count()
+        self.started = time.monotonic()
+        self.processed = 0
+        with transaction.atomic():
+            if options['copy'] and not options['dry_run']:
+                self.create_copy_table()
+            batch = []
+            for row in self.read_unique(options['paths']):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self.flush(batch, write)
+                    batch = []
+            self.flush(batch, write)
+            if options['copy'] and not options['dry_run']:
+                self.insert_from_copy_table()
+        if options['dry_run']:
+            self.stdout.write(
+                f'Найдено {self.processed} уникальных ингредиентов, '
+                f'база данных не изменена'
+            )
+            return
+        bump_version(Ingredient)
+        created = Ingredient.objects.count() - before
+        self.stdout.write(
+            f'Добавлено {created} из {self.processed} ингредиентов'
+        )
         self.stdout.write("Все ингредиенты загружены в базу данных")
+
+    def read_unique(self, paths):
+        seen = set()
+        for path in paths:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                raise CommandError(f'Неизвестный формат файла {path}')
+            with open(path, 'r', encoding='utf-8') as file:
+                for row in reader(file):
+                    if row not in seen:
+                        seen.add(row)
+                        yield row
+
+    def flush(self, batch, write):
+        if not batch:
+            return
+        if write is not None:
+            write(batch)
+        self.processed += len(batch)
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано {self.processed} строк ({rate:.0f} строк/с)'
+        )
+
+    def write_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch],
+            ignore_conflicts=True
+        )
+
+    def create_copy_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    def insert_from_copy_table(self):
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_import '
+                f'ON CONFLICT DO NOTHING'
+            )
+            cursor.execute('DROP TABLE ingredient_import')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Re-encode recipe images and generate thumbnails'
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(image_ready=False).exclude(
+            image=''
+        ).values_list('pk', 'image')
+        processed = 0
+        for recipe_id, name in recipes.iterator():
+            try:
+                process_recipe_image(recipe_id, name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(f'Обработано {processed} изображений')
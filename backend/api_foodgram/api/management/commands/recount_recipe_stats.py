@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from api.services import RECIPE_COUNTERS, get_recipe_counters
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recount favorites and shopping cart counters of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной транзакции'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только найти расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Recipe.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        counters = get_recipe_counters()
+        actual = {
+            f'actual_{field}': value for field, value in counters.items()
+        }
+        drift = Q()
+        for field in RECIPE_COUNTERS.values():
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+        fixed = 0
+        for start in range(0, last_id + 1, batch_size):
+            with transaction.atomic():
+                batch = Recipe.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size
+                )
+                drifted = list(batch.annotate(**actual).filter(
+                    drift
+                ).values_list('pk', flat=True))
+                if drifted and not options['dry_run']:
+                    Recipe.objects.filter(pk__in=drifted).update(**counters)
+            fixed += len(drifted)
+        if options['dry_run']:
+            self.stdout.write(f'Найдено {fixed} рецептов с расхождениями')
+            return
+        self.stdout.write(f'Исправлено {fixed} рецептов')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'Add new favorites and shopping cart events to the trending scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном запросе'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        events, recipes = refresh_popularity(options['batch_size'])
+        self.stdout.write(
+            f'Учтено {events} событий для {recipes} рецептов '
+            f'за {time.monotonic() - started:.2f} с'
+        )
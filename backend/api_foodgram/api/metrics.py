@@ -0,0 +1,203 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+
+from .caches import get_recipe_list_metrics
+
+QUANTILES = (0.5, 0.95, 0.99)
+SUMMARIES = (
+    ('latency', 'api_request_duration_seconds',
+     'Total request latency'),
+    ('db_time', 'api_request_db_seconds',
+     'Time spent in SQL queries'),
+    ('app_time', 'api_request_app_seconds',
+     'Time spent in view code and rendering outside SQL'),
+    ('queries', 'api_request_queries',
+     'SQL queries per request'),
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_views = {}
+_connections = Counter()
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+def get_fingerprint(sql):
+    return md5(sql.encode()).hexdigest()[:12]
+
+
+def is_sampled():
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def count_connection(alias):
+    with _lock:
+        _connections[alias] += 1
+
+
+@contextmanager
+def track_queries(metrics):
+    previous = current_metrics.get()
+    current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        current_metrics.set(previous)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.view_started = None
+        self.db_time = 0
+        self.queries = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.db_time += elapsed
+                self.queries[sql] += 1
+
+    def start_view(self, name):
+        self.view = name
+        self.view_started = time.perf_counter()
+
+    def get_timings(self):
+        finished = time.perf_counter()
+        view_time = finished - (self.view_started or finished)
+        return {
+            'latency': finished - self.started,
+            'db_time': self.db_time,
+            'app_time': max(view_time - self.db_time, 0),
+            'queries': sum(self.queries.values()),
+        }
+
+    def get_server_timing(self, timings):
+        return ', '.join((
+            f'db;dur={timings["db_time"] * 1000:.1f};'
+            f'desc="{timings["queries"]} queries"',
+            f'app;dur={timings["app_time"] * 1000:.1f}',
+            f'total;dur={timings["latency"] * 1000:.1f}',
+        ))
+
+    def record(self, timings):
+        if self.view is None:
+            return
+        duplicates = {
+            sql: count for sql, count in self.queries.items() if count > 1
+        }
+        with _lock:
+            stats = _views.get(self.view)
+            if stats is None:
+                stats = _views[self.view] = ViewStats()
+            stats.add(timings)
+            for sql, count in duplicates.items():
+                stats.add_duplicate(self.view, sql, count)
+
+
+class ViewStats:
+    def __init__(self):
+        self.samples = {
+            name: deque(maxlen=settings.METRICS_WINDOW)
+            for name, _, _ in SUMMARIES
+        }
+        self.sums = dict.fromkeys(self.samples, 0)
+        self.count = 0
+        self.duplicates = Counter()
+
+    def add(self, timings):
+        self.count += 1
+        for name, value in timings.items():
+            self.samples[name].append(value)
+            self.sums[name] += value
+
+    def add_duplicate(self, view, sql, count):
+        fingerprint = get_fingerprint(sql)
+        if fingerprint not in self.duplicates:
+            if len(self.duplicates) >= settings.METRICS_MAX_FINGERPRINTS:
+                return
+            logger.warning(
+                'Повторяющийся запрос %s в %s: %s', fingerprint, view, sql
+            )
+        self.duplicates[fingerprint] += count - 1
+
+    def get_quantiles(self, name):
+        values = sorted(self.samples[name])
+        if not values:
+            return {}
+        return {
+            quantile: values[min(int(quantile * len(values)), len(values) - 1)]
+            for quantile in QUANTILES
+        }
+
+
+def format_labels(**labels):
+    return ','.join(
+        f'{name}="{value}"' for name, value in sorted(labels.items())
+    )
+
+
+def render_metrics():
+    lines = []
+    with _lock:
+        views = sorted(_views.items())
+        for name, metric, description in SUMMARIES:
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} summary')
+            for view, stats in views:
+                for quantile, value in stats.get_quantiles(name).items():
+                    labels = format_labels(view=view, quantile=quantile)
+                    lines.append(f'{metric}{{{labels}}} {value:.6g}')
+                labels = format_labels(view=view)
+                total = stats.sums[name]
+                lines.append(f'{metric}_sum{{{labels}}} {total:.6g}')
+                lines.append(f'{metric}_count{{{labels}}} {stats.count}')
+        metric = 'api_duplicate_queries_total'
+        lines.append(f'# HELP {metric} Repeated SQL queries within a request')
+        lines.append(f'# TYPE {metric} counter')
+        for view, stats in views:
+            for fingerprint, count in sorted(stats.duplicates.items()):
+                labels = format_labels(view=view, fingerprint=fingerprint)
+                lines.append(f'{metric}{{{labels}}} {count}')
+        metric = 'api_db_connections_total'
+        lines.append(f'# HELP {metric} Database connections opened by worker')
+        lines.append(f'# TYPE {metric} counter')
+        for alias, count in sorted(_connections.items()):
+            labels = format_labels(alias=alias, worker=os.getpid())
+            lines.append(f'{metric}{{{labels}}} {count}')
+    metric = 'api_recipe_list_cache_total'
+    lines.append(f'# HELP {metric} Recipe list cache lookups')
+    lines.append(f'# TYPE {metric} counter')
+    for result, count in get_recipe_list_metrics().items():
+        lines.append(f'{metric}{{{format_labels(result=result)}}} {count}')
+    return '\n'.join(lines) + '\n'
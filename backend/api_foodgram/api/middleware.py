@@ -0,0 +1,135 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import RequestMetrics, is_sampled, track_queries
+from .replicas import (can_read_from_replica, get_primary_pin_key, get_replica,
+                       read_from, should_pin_primary)
+
+
+def get_view_name(view_func, request):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        if not is_sampled():
+            return self.get_response(request)
+        metrics = request.query_metrics = RequestMetrics()
+        with track_queries(metrics):
+            response = self.get_response(request)
+        return self.finish(response, metrics)
+
+    async def acall(self, request):
+        if not is_sampled():
+            return await self.get_response(request)
+        metrics = request.query_metrics = RequestMetrics()
+        with track_queries(metrics):
+            response = await self.get_response(request)
+        return self.finish(response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'query_metrics', None)
+        if metrics is not None:
+            metrics.start_view(get_view_name(view_func, request))
+
+    def finish(self, response, metrics):
+        timings = metrics.get_timings()
+        if not response.streaming:
+            metrics.record(timings)
+        elif response.is_async:
+            response.streaming_content = self.astream(
+                response.streaming_content, metrics
+            )
+        else:
+            response.streaming_content = self.stream(
+                response.streaming_content, metrics
+            )
+        response['Server-Timing'] = metrics.get_server_timing(timings)
+        return response
+
+    def stream(self, content, metrics):
+        with track_queries(metrics):
+            yield from content
+        metrics.record(metrics.get_timings())
+
+    async def astream(self, content, metrics):
+        with track_queries(metrics):
+            async for chunk in content:
+                yield chunk
+        metrics.record(metrics.get_timings())
+
+
+class ReplicaReadMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        key = get_primary_pin_key(request)
+        database = None
+        if can_read_from_replica(request):
+            if key is None or not cache.get(key):
+                database = get_replica()
+        with read_from(database):
+            response = self.get_response(request)
+        if key is not None and should_pin_primary(request, response):
+            cache.set(key, True, settings.DATABASE_REPLICA_LAG)
+        return self.finish(response, database)
+
+    async def acall(self, request):
+        key = get_primary_pin_key(request)
+        database = None
+        if can_read_from_replica(request):
+            if key is None or not await cache.aget(key):
+                database = get_replica()
+        with read_from(database):
+            response = await self.get_response(request)
+        if key is not None and should_pin_primary(request, response):
+            await cache.aset(key, True, settings.DATABASE_REPLICA_LAG)
+        return self.finish(response, database)
+
+    def finish(self, response, database):
+        if database is None or not response.streaming:
+            return response
+        if response.is_async:
+            response.streaming_content = self.astream(
+                response.streaming_content, database
+            )
+        else:
+            response.streaming_content = self.stream(
+                response.streaming_content, database
+            )
+        return response
+
+    def stream(self, content, database):
+        with read_from(database):
+            yield from content
+
+    async def astream(self, content, database):
+        with read_from(database):
+            async for chunk in content:
+                yield chunk
@@ -1,5 +1,175 @@
+import asyncio
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.db import close_old_connections, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.pagination import PageNumberPagination as DRF_Pagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ApproximateCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        threshold = settings.APPROXIMATE_COUNT_THRESHOLD
+        queryset = self.object_list
+        if not threshold or not hasattr(queryset, 'query'):
+            return super().count
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < threshold:
+            return super().count
+        return estimate
+
+
+def run_in_thread(func, *args):
+    def call():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
 
 
 class PageNumberPagination(DRF_Pagination):
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param) or 1
+        try:
+            offset = (int(page_number) - 1) * page_size
+        except (TypeError, ValueError):
+            offset = -1
+        if not page_size or offset < 0:
+            return await sync_to_async(self.paginate_queryset)(
+                queryset, request, view
+            )
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count, results = await asyncio.gather(
+            run_in_thread(lambda: paginator.count),
+            sync_to_async(list)(queryset[offset:offset + page_size])
+        )
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page = paginator._get_page(results, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return results
+
+
+class RecipeCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gte=pub_date),
+                    Q(pub_date__gt=pub_date) | Q(pk__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lte=pub_date),
+                    Q(pub_date__lt=pub_date) | Q(pk__lt=pk)
+                )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.results = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.results:
+            return None
+        return self.encode_cursor(False, self.results[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.results:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(True, self.results[0])
+
+    def encode_cursor(self, reverse, recipe):
+        tokens = {'d': recipe.pub_date.isoformat(), 'i': recipe.pk}
+        if reverse:
+            tokens['r'] = 1
+        cursor = b64encode(urlencode(tokens).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            tokens = parse_qs(b64decode(cursor.encode()).decode())
+            pub_date = parse_datetime(tokens['d'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, IndexError):
+            raise NotFound('Некорректный курсор')
+        if pub_date is None:
+            raise NotFound('Некорректный курсор')
+        return reverse, (pub_date, pk)
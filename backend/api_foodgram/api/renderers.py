@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer, ABC):
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        yield from self.start()
+        for index, item in enumerate(rows):
+            yield self.render_row(index, item)
+        yield from self.finish()
+
+    async def astream(self, rows):
+        for chunk in self.start():
+            yield chunk
+        index = 0
+        async for item in rows:
+            yield self.render_row(index, item)
+            index += 1
+        for chunk in self.finish():
+            yield chunk
+
+    def start(self):
+        return ()
+
+    def finish(self):
+        return ()
+
+    @abstractmethod
+    def render_row(self, index, item):
+        pass
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render_row(self, index, item):
+        return (f'{item["name"]} ({item["amount"]})'
+                f'{item["measurement_unit"]}, \n')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def start(self):
+        yield self.writer.writerow(('name', 'amount', 'measurement_unit'))
+
+    def render_row(self, index, item):
+        return self.writer.writerow(
+            (item['name'], item['amount'], item['measurement_unit'])
+        )
+
+
+class JsonShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def start(self):
+        yield '['
+
+    def finish(self):
+        yield ']'
+
+    def render_row(self, index, item):
+        separator = ',' if index else ''
+        return separator + json.dumps(item, ensure_ascii=False)
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def stream(self, rows):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.PDF_FONT_PATH)
+            )
+        buffer = io.BytesIO()
+        page = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        line_height = self.font_size * 1.5
+        y = None
+        for index, item in enumerate(rows):
+            if y is None or y < self.margin:
+                if y is not None:
+                    page.showPage()
+                page.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            page.drawString(self.margin, y, self.render_row(index, item))
+            y -= line_height
+        page.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(self.chunk_size), b'')
+
+    def render_row(self, index, item):
+        return (f'{item["name"]} ({item["amount"]}) '
+                f'{item["measurement_unit"]}')
+
+    async def astream(self, rows):
+        items = [item async for item in rows]
+        for chunk in await sync_to_async(list)(self.stream(items)):
+            yield chunk
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            data = json.dumps(data, ensure_ascii=False)
+        return data.encode('utf-8')
+
+
+SHOPPING_LIST_RENDERERS = (
+    TxtShoppingListRenderer,
+    CsvShoppingListRenderer,
+    JsonShoppingListRenderer,
+    PdfShoppingListRenderer,
+)
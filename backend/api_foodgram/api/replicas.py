@@ -0,0 +1,80 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_PIN_KEY = 'primary_pin:{}'
+PRIMARY_READ_MODELS = {'authtoken.token'}
+
+read_database = ContextVar('read_database', default=None)
+
+
+def get_primary_pin_key(request):
+    credentials = request.headers.get('Authorization')
+    if not credentials:
+        credentials = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return PRIMARY_PIN_KEY.format(md5(credentials.encode()).hexdigest())
+
+
+def can_read_from_replica(request):
+    return bool(settings.DATABASE_REPLICAS) and request.method in SAFE_METHODS
+
+
+def should_pin_primary(request, response):
+    return all((
+        settings.DATABASE_REPLICAS,
+        settings.DATABASE_REPLICA_LAG > 0,
+        request.method not in SAFE_METHODS,
+        response.status_code < 400,
+    ))
+
+
+def get_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def is_replica_stale(version):
+    if read_database.get() is None:
+        return False
+    return time.time() - version < settings.DATABASE_REPLICA_LAG
+
+
+@contextmanager
+def read_from(database):
+    previous = read_database.get()
+    read_database.set(database)
+    try:
+        yield database
+    finally:
+        read_database.set(previous)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        database = read_database.get()
+        if database is None:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in PRIMARY_READ_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
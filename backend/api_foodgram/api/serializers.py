@@ -1,7 +1,4 @@
-import base64
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer as DjoserCreateSerializer
 from djoser.serializers import UserSerializer as DjoserUserSerializer
@@ -9,6 +6,11 @@ from rest_framework import serializers
 
 from recipes.models import Ingredient, IngredientWithWT, Recipe, Tag
 
+from .caches import bump_version
+from .images import (decode_base64_image, get_image_urls, is_same_image,
+                     schedule_recipe_image)
+from .services import get_subscribed_ids
+
 User = get_user_model()
 
 
@@ -23,10 +25,12 @@ class UserSerializer(DjoserUserSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if request.user.is_anonymous:
             return False
-        return obj.following.filter(user=user).exists()
+        return obj.id in get_subscribed_ids(request)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -43,10 +47,21 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
+class ImageUrlsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return get_image_urls(recipe, self.context.get('request'))
+
+
 class ReducedRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ImageUrlsField()
 
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
         model = Recipe
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
@@ -64,6 +79,16 @@ class IngredientWithWTSerializer(serializers.ModelSerializer):
         model = IngredientWithWT
 
 
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+def get_recipes_limit(request):
+    serializer = RecipesLimitSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data.get('recipes_limit')
+
+
 class UsersWithRecipesSerializer(UserSerializer):
 
     recipes = serializers.SerializerMethodField()
@@ -84,35 +109,30 @@ class UsersWithRecipesSerializer(UserSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
-    def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return obj.following.filter(user=user).exists()
-
     def get_recipes(self, obj):
-        recipes_limit = self.context.get(
-            'request'
-        ).query_params.get('recipes_limit')
-        queryset = obj.recipes.all()
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
+        queryset = getattr(obj, 'latest_recipes', None)
+        if queryset is None:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            queryset = obj.recipes.all()
+            if recipes_limit is not None:
+                queryset = queryset[:recipes_limit]
         return ReducedRecipeSerializer(queryset, many=True).data
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
         return super().to_internal_value(data)
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
+    thumbnails = ImageUrlsField()
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     is_favorited = serializers.BooleanField(
@@ -127,14 +147,17 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     class Meta:
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'thumbnails', 'text',
+            'cooking_time'
         )
         model = Recipe
 
     def get_ingredients(self, obj):
-        query = IngredientWithWT.objects.filter(
-            recipe=obj
-        ).select_related('ingredient')
+        query = getattr(obj, 'ingredient_amounts', None)
+        if query is None:
+            query = IngredientWithWT.objects.filter(
+                recipe=obj
+            ).select_related('ingredient')
         serializer = IngredientWithWTSerializer(query, many=True)
         return serializer.data
 
@@ -144,8 +167,17 @@ class IngredientForRecipeWriteSerializer(serializers.Serializer):
     amount = serializers.IntegerField()
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     image = Base64ImageField(max_length=None, use_url=True)
+    thumbnails = ImageUrlsField()
     tags = serializers.ListField(
         child=serializers.IntegerField(),
         write_only=True
@@ -158,15 +190,23 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     class Meta:
         fields = (
             'tags', 'ingredients', 'name', 'author',
-            'image', 'text', 'cooking_time', 'id'
+            'image', 'thumbnails', 'text', 'cooking_time', 'id'
         )
         model = Recipe
 
     def to_representation(self, instance):
         recipe = super().to_representation(instance)
-        recipe['tags'] = TagSerializer(instance.tags.all(), many=True).data
+        tags = getattr(instance, 'selected_tags', None)
+        if tags is None:
+            tags = instance.tags.all()
+        rows = getattr(instance, 'ingredient_amounts', None)
+        if rows is None:
+            rows = IngredientWithWT.objects.filter(
+                recipe=instance
+            ).select_related('ingredient')
+        recipe['tags'] = TagSerializer(tags, many=True).data
         recipe['ingredients'] = IngredientWithWTSerializer(
-            instance.ingredients.all(), many=True
+            rows, many=True
         ).data
         return recipe
 
@@ -177,47 +217,85 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         author = self.context.get('request').user
         recipe = Recipe(**validated_data, author=author)
         recipe.save()
-        ingredient_wt_obj_list = []
-        for ingredient in ingredients:
-            ingredient_wt_obj_list.append(
-                IngredientWithWT(
-                    ingredient_id=ingredient['id'],
-                    recipe_id=recipe.id,
-                    amount=ingredient['amount'],
-                )
+        recipe.ingredient_amounts = [
+            IngredientWithWT(
+                ingredient=ingredient['ingredient'],
+                recipe=recipe,
+                amount=ingredient['amount'],
             )
-        IngredientWithWT.objects.bulk_create(
-            ingredient_wt_obj_list
-        )
+            for ingredient in ingredients
+        ]
+        IngredientWithWT.objects.bulk_create(recipe.ingredient_amounts)
         recipe.tags.set(tags)
+        recipe.selected_tags = tags
+        schedule_recipe_image(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.name = validated_data['name']
-        instance.text = validated_data['text']
-        instance.cooking_time = validated_data['cooking_time']
-        if 'image' in validated_data.keys():
-            instance.image = validated_data['image']
-        ingredient_wt_obj_list = []
-        IngredientWithWT.objects.filter(recipe__exact=instance).delete()
-        for ingredient in ingredients:
-            ingredient_wt_obj_list.append(
-                IngredientWithWT(
-                    ingredient_id=ingredient['id'],
-                    recipe=instance,
-                    amount=int(ingredient['amount'])
-                )
-            )
-        IngredientWithWT.objects.bulk_create(
-            ingredient_wt_obj_list
-        )
-        instance.tags.set(tags)
-        instance.save()
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        image = validated_data.get('image')
+        if image is not None and is_same_image(instance.image, image):
+            del validated_data['image']
+        update_fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in update_fields:
+            setattr(instance, field, validated_data[field])
+        if 'image' in update_fields:
+            instance.image_ready = False
+            update_fields.append('image_ready')
+        if update_fields:
+            instance.save(update_fields=update_fields)
+            schedule_recipe_image(instance)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            instance.tags.set(tags)
+            instance.selected_tags = tags
         return instance
 
+    def update_ingredients(self, instance, ingredients):
+        items = {
+            ingredient['ingredient'].pk: ingredient
+            for ingredient in ingredients
+        }
+        existing = getattr(instance, 'ingredient_amounts', None)
+        if existing is None:
+            existing = IngredientWithWT.objects.filter(recipe=instance)
+        rows, changed, removed = {}, [], []
+        for row in existing:
+            item = items.get(row.ingredient_id)
+            if item is None or row.ingredient_id in rows:
+                removed.append(row.pk)
+                continue
+            row.ingredient = item['ingredient']
+            rows[row.ingredient_id] = row
+            if row.amount != item['amount']:
+                row.amount = item['amount']
+                changed.append(row)
+        added = [
+            IngredientWithWT(
+                ingredient=item['ingredient'],
+                recipe=instance,
+                amount=item['amount']
+            )
+            for ingredient_id, item in items.items()
+            if ingredient_id not in rows
+        ]
+        rows.update((row.ingredient_id, row) for row in added)
+        instance.ingredient_amounts = [
+            rows[ingredient_id] for ingredient_id in items
+        ]
+        if not (changed or added or removed):
+            return
+        IngredientWithWT.objects.bulk_update(changed, ['amount'])
+        IngredientWithWT.objects.bulk_create(added)
+        IngredientWithWT.objects.filter(pk__in=removed).delete()
+        bump_version(IngredientWithWT)
+
     def validate_name(self, value):
         if len(value) > 200:
             raise serializers.ValidationError(
@@ -237,32 +315,42 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Рецепт должен содержать хотя бы один ингредиент'
             )
-        for ingredient in value:
-            if ingredient['amount'] <= 0:
-                raise serializers.ValidationError(
-                    (f'Количество '
-                     f'{Ingredient.objects.get(pk=ingredient["id"]).name} '
-                     f'не может быть меньше 1')
-                )
         ingredient_ids = [ingredient['id'] for ingredient in value]
         if len(set(ingredient_ids)) != len(ingredient_ids):
             raise serializers.ValidationError(
                 'Добавлен дублирующийся ингридиент'
             )
-        if len(set(ingredient_ids)) != Ingredient.objects.filter(
-            id__in=ingredient_ids
-        ).count():
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        if len(ingredients) != len(ingredient_ids):
             raise serializers.ValidationError(
                 'Добавлен ингридиент с несуществующим id'
             )
-        return value
+        for ingredient in value:
+            if ingredient['amount'] <= 0:
+                raise serializers.ValidationError(
+                    (f'Количество '
+                     f'{ingredients[ingredient["id"]].name} '
+                     f'не может быть меньше 1')
+                )
+        return [
+            {
+                'ingredient': ingredients[ingredient['id']],
+                'amount': ingredient['amount'],
+            }
+            for ingredient in value
+        ]
 
     def validate_tags(self, value):
         if len(value) == 0:
             raise serializers.ValidationError(
                 'Рецепт должен содержать хотя бы один тег'
             )
-        return value
+        tags = Tag.objects.in_bulk(value)
+        if len(tags) != len(set(value)):
+            raise serializers.ValidationError(
+                'Добавлен тег с несуществующим id'
+            )
+        return [tags[tag_id] for tag_id in dict.fromkeys(value)]
 
 
 class UserCreateSerializer(DjoserCreateSerializer):
@@ -1,18 +1,157 @@
-from django.db.models import Sum
-
-from recipes.models import Ingredient, IngredientWithWT, ShoppingCart
-
-
-def get_shopping_list(user):
-    recipe_ids = []
-    for obj in ShoppingCart.objects.filter(user=user):
-        recipe_ids.append(obj.recipe.id)
-    queryset = IngredientWithWT.objects.filter(
-        recipe__in=recipe_ids
-    ).values('ingredient_id').annotate(amount=Sum('amount'))
-    shopping_cart = ''
-    for item in queryset:
-        ingredient = Ingredient.objects.get(pk=item['ingredient_id'])
-        shopping_cart += (f'{ingredient.name} ({item["amount"]})'
-                          f'{ingredient.measurement_unit}, \n')
-    return shopping_cart
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncHour
+from django.utils import timezone
+
+from recipes.models import (Favorite, IngredientWithWT, PopularityState,
+                            Recipe, RecipePopularity, ShoppingCart,
+                            Subscriptions)
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+TRENDING_SOURCES = {
+    Favorite: 'favorite',
+    ShoppingCart: 'shopping_cart',
+}
+TRENDING_BUCKET = timedelta(hours=1)
+TRENDING_COMMIT_LAG = timedelta(seconds=30)
+TRENDING_REBASE_HALF_LIVES = 32
+TRENDING_MIN_SCORE = 1e-3
+
+
+def get_shopping_list_rows(user):
+    return IngredientWithWT.objects.filter(
+        recipe__users_carts__user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(
+        amount=Sum('amount')
+    ).order_by('name', 'measurement_unit')
+
+
+def get_subscribed_ids(request):
+    if not hasattr(request, 'subscribed_ids'):
+        request.subscribed_ids = set(
+            Subscriptions.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request.subscribed_ids
+
+
+def set_recipe_user_flags(recipes, request=None):
+    favorited, in_cart, subscribed = set(), set(), set()
+    if request is not None and request.user.is_authenticated:
+        user = request.user
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        subscribed = get_subscribed_ids(request)
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscribed
+        )
+    return recipes
+
+
+def update_recipe_counter(model, recipes, delta):
+    field = RECIPE_COUNTERS[model]
+    return Recipe.objects.filter(pk__in=recipes).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def recount_recipe_counter(model, recipes):
+    field = RECIPE_COUNTERS[model]
+    return Recipe.objects.filter(pk__in=recipes).update(
+        **{field: get_recipe_counters()[field]}
+    )
+
+
+def get_recipe_counters():
+    return {
+        field: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)
+        for model, field in RECIPE_COUNTERS.items()
+    }
+
+
+def get_trending_increments(since, until, epoch):
+    half_life = settings.TRENDING_HALF_LIFE
+    increments = defaultdict(float)
+    events = 0
+    for model, source in TRENDING_SOURCES.items():
+        weight = settings.TRENDING_WEIGHTS[source]
+        rows = model.objects.filter(
+            created__gt=since, created__lte=until
+        ).values('recipe', hour=TruncHour('created')).annotate(
+            total=Count('pk')
+        ).order_by()
+        for row in rows.iterator():
+            middle = row['hour'] + TRENDING_BUCKET / 2
+            age = (middle - epoch).total_seconds()
+            increments[row['recipe']] += (
+                weight * row['total'] * 2 ** (age / half_life)
+            )
+            events += row['total']
+    return increments, events
+
+
+def rebase_popularity(state, now):
+    half_lives = (now - state.epoch).total_seconds()
+    half_lives /= settings.TRENDING_HALF_LIFE
+    if half_lives < TRENDING_REBASE_HALF_LIVES:
+        return
+    RecipePopularity.objects.update(score=F('score') * 2 ** -half_lives)
+    RecipePopularity.objects.filter(score__lt=TRENDING_MIN_SCORE).delete()
+    state.epoch = now
+
+
+def refresh_popularity(batch_size=1000):
+    now = timezone.now()
+    until = now - TRENDING_COMMIT_LAG
+    horizon = timedelta(
+        seconds=settings.TRENDING_HALF_LIFE * TRENDING_REBASE_HALF_LIVES
+    )
+    PopularityState.objects.get_or_create(
+        pk=1, defaults={'epoch': now, 'watermark': now - horizon}
+    )
+    with transaction.atomic():
+        state = PopularityState.objects.select_for_update().get(pk=1)
+        rebase_popularity(state, now)
+        increments, events = get_trending_increments(
+            state.watermark, until, state.epoch
+        )
+        recipe_ids = list(increments)
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            existing = RecipePopularity.objects.in_bulk(batch)
+            for popularity in existing.values():
+                popularity.score += increments[popularity.pk]
+            RecipePopularity.objects.bulk_update(existing.values(), ['score'])
+            RecipePopularity.objects.bulk_create([
+                RecipePopularity(
+                    recipe_id=recipe_id, score=increments[recipe_id]
+                )
+                for recipe_id in batch if recipe_id not in existing
+            ])
+        state.watermark = max(state.watermark, until)
+        state.save()
+    return events, len(recipe_ids)
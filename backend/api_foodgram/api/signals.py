@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+
+from recipes.models import (Favorite, Ingredient, IngredientWithWT, Recipe,
+                            ShoppingCart, Subscriptions, Tag)
+
+from .caches import bump_version
+from .metrics import count_connection, install_query_recorder
+from .services import RECIPE_COUNTERS, update_recipe_counter
+
+User = get_user_model()
+
+VERSIONED_MODELS = (
+    Ingredient, Tag, Recipe, IngredientWithWT,
+    Favorite, ShoppingCart, Subscriptions, User,
+)
+UNVERSIONED_FIELDS = {
+    User: {'last_login'},
+}
+
+
+def is_versioned_save(sender, update_fields):
+    return not update_fields or not set(update_fields) <= (
+        UNVERSIONED_FIELDS.get(sender, set())
+    )
+
+
+def bump_model_version(sender, update_fields=None, **kwargs):
+    if is_versioned_save(sender, update_fields):
+        bump_version(sender)
+
+
+def bump_recipe_version(sender, **kwargs):
+    bump_version(Recipe)
+
+
+def bump_author_recipes_version(sender, instance, created=False,
+                                update_fields=None, **kwargs):
+    if created or not is_versioned_save(sender, update_fields):
+        return
+    if Recipe.objects.filter(author=instance).exists():
+        bump_version(Recipe)
+
+
+def record_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
+    count_connection(connection.alias)
+
+
+def get_origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def add_recipe_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_recipe_counter(sender, [instance.recipe_id], 1)
+
+
+def remove_recipe_counter(sender, instance, origin=None, **kwargs):
+    if get_origin_model(origin) in (Recipe, User):
+        return
+    update_recipe_counter(sender, [instance.recipe_id], -1)
+
+
+def release_recipe_counters(sender, instance, **kwargs):
+    for model in RECIPE_COUNTERS:
+        update_recipe_counter(
+            model, model.objects.filter(user=instance).values('recipe'), -1
+        )
+
+
+for model in VERSIONED_MODELS:
+    for signal in (post_save, post_delete):
+        signal.connect(
+            bump_model_version, sender=model,
+            dispatch_uid=f'bump_version_{model._meta.label_lower}'
+        )
+post_save.connect(
+    bump_author_recipes_version, sender=User,
+    dispatch_uid='bump_version_author_recipes'
+)
+m2m_changed.connect(
+    bump_recipe_version, sender=Recipe.tags.through,
+    dispatch_uid='bump_version_recipe_tags'
+)
+for model in RECIPE_COUNTERS:
+    post_save.connect(
+        add_recipe_counter, sender=model,
+        dispatch_uid=f'add_recipe_counter_{model._meta.label_lower}'
+    )
+    post_delete.connect(
+        remove_recipe_counter, sender=model,
+        dispatch_uid=f'remove_recipe_counter_{model._meta.label_lower}'
+    )
+pre_delete.connect(
+    release_recipe_counters, sender=User,
+    dispatch_uid='release_recipe_counters'
+)
+connection_created.connect(
+    record_connection, dispatch_uid='record_connection'
+)
@@ -0,0 +1,67 @@
+from base64 import b64encode
+from io import BytesIO
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientWithWT, Recipe, Tag
+
+User = get_user_model()
+
+sequence = count()
+
+
+def create_user(**kwargs):
+    number = next(sequence)
+    kwargs.setdefault('username', f'user{number}')
+    kwargs.setdefault('email', f'user{number}@example.com')
+    kwargs.setdefault('first_name', 'Имя')
+    kwargs.setdefault('last_name', 'Фамилия')
+    kwargs.setdefault('password', 'password')
+    return User.objects.create_user(**kwargs)
+
+
+def create_tag(**kwargs):
+    number = next(sequence)
+    kwargs.setdefault('name', f'Тэг {number}')
+    kwargs.setdefault('color', f'#{number:06x}')
+    kwargs.setdefault('slug', f'tag{number}')
+    return Tag.objects.create(**kwargs)
+
+
+def create_ingredients(size, prefix='ингредиент'):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'{prefix} {next(sequence)}', measurement_unit='г')
+        for _ in range(size)
+    )
+
+
+def create_recipe(author, tags=(), ingredients=(), **kwargs):
+    kwargs.setdefault('name', f'Рецепт {next(sequence)}')
+    kwargs.setdefault('text', 'Описание')
+    kwargs.setdefault('cooking_time', 10)
+    kwargs.setdefault('image', 'images/recipe.png')
+    recipe = Recipe.objects.create(author=author, **kwargs)
+    recipe.tags.set(tags)
+    IngredientWithWT.objects.bulk_create(
+        IngredientWithWT(recipe=recipe, ingredient=ingredient, amount=index)
+        for index, ingredient in enumerate(ingredients, 1)
+    )
+    return recipe
+
+
+def get_image_data(color='red', size=(8, 8)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
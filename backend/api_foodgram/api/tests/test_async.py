@@ -0,0 +1,134 @@
+import json
+import runpy
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from api import paginators
+from api.views import AsyncActionsMixin
+from recipes.models import ShoppingCart
+
+from .factories import (create_ingredients, create_recipe, create_tag,
+                        create_user)
+
+with mock.patch.object(AsyncActionsMixin, 'view_is_async', True):
+    urlpatterns = [
+        path('api/', include(runpy.run_module('api.urls')['urlpatterns'])),
+    ]
+
+
+@override_settings(ROOT_URLCONF=__name__, ASYNC_VIEWS=True)
+class AsyncViewsTests(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(AsyncActionsMixin, 'view_is_async', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user()
+        self.tag = create_tag()
+        self.ingredients = create_ingredients(3, prefix='соль')
+        author = create_user()
+        self.recipes = [
+            create_recipe(
+                author, tags=[self.tag], ingredients=self.ingredients
+            )
+            for _ in range(5)
+        ]
+        token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {token.key}'}
+
+    async def get_json(self, url, **params):
+        response = await self.async_client.get(
+            url, params, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    async def test_list_fetches_count_and_page_concurrently(self):
+        with mock.patch.object(
+            paginators, 'run_in_thread', wraps=paginators.run_in_thread
+        ) as run_in_thread:
+            data = await self.get_json('/api/recipes/', limit=2, page=2)
+        run_in_thread.assert_called_once()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            [recipe.pk for recipe in self.recipes[::-1][2:4]]
+        )
+        self.assertIsNotNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+        self.assertEqual(len(data['results'][0]['ingredients']), 3)
+
+    async def test_list_invalid_page(self):
+        response = await self.async_client.get(
+            '/api/recipes/', {'page': 99}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_list_user_flags(self):
+        await ShoppingCart.objects.acreate(
+            user=self.user, recipe=self.recipes[0]
+        )
+        data = await self.get_json('/api/recipes/', is_in_shopping_cart=1)
+        self.assertEqual(data['count'], 1)
+        self.assertTrue(data['results'][0]['is_in_shopping_cart'])
+
+    async def test_retrieve(self):
+        recipe = self.recipes[0]
+        data = await self.get_json(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(data['id'], recipe.pk)
+        self.assertEqual(data['tags'][0]['slug'], self.tag.slug)
+        response = await self.async_client.get(
+            '/api/recipes/0/', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cursor_pages(self):
+        data = await self.get_json('/api/recipes/', cursor='', limit=2)
+        ids = [recipe['id'] for recipe in data['results']]
+        while data['next']:
+            data = await self.get_json(data['next'])
+            ids += [recipe['id'] for recipe in data['results']]
+        self.assertEqual(ids, [recipe.pk for recipe in self.recipes[::-1]])
+
+    async def test_catalogs(self):
+        tags = await self.get_json('/api/tags/')
+        self.assertEqual([tag['id'] for tag in tags], [self.tag.pk])
+        ingredients = await self.get_json('/api/ingredients/', name='соль')
+        self.assertEqual(len(ingredients), 3)
+
+    async def test_download_shopping_cart(self):
+        for recipe in self.recipes[:2]:
+            await ShoppingCart.objects.acreate(user=self.user, recipe=recipe)
+        for format in ('txt', 'csv', 'json', 'pdf'):
+            with self.subTest(format=format):
+                response = await self.async_client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': format}, headers=self.headers
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.is_async)
+                content = b''.join([
+                    chunk async for chunk in response.streaming_content
+                ])
+                self.assertTrue(content)
+                if format == 'json':
+                    rows = json.loads(content)
+                    self.assertEqual(len(rows), 3)
+                    self.assertEqual(
+                        sorted(row['amount'] for row in rows), [2, 4, 6]
+                    )
+
+    async def test_download_requires_authentication(self):
+        response = await self.async_client.get(
+            '/api/recipes/download_shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response = await self.async_client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'xml'},
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
@@ -0,0 +1,127 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .factories import client_for, create_recipe, create_user
+
+ENDPOINTS = {
+    Favorite: '/api/recipes/favorite/bulk/',
+    ShoppingCart: '/api/recipes/shopping_cart/bulk/',
+}
+
+
+class BulkEndpointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user()
+        cls.recipes = [create_recipe(author) for _ in range(100)]
+        cls.ids = [recipe.pk for recipe in cls.recipes]
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = client_for(self.user)
+
+    def request(self, method, model, ids):
+        return getattr(self.client, method)(
+            ENDPOINTS[model], {'recipes': ids}, format='json'
+        )
+
+    def count_queries(self, method, model, ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(method, model, ids)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_add_outcomes(self):
+        missing = max(self.ids) + 1
+        for model in ENDPOINTS:
+            with self.subTest(model=model.__name__):
+                model.objects.create(user=self.user, recipe=self.recipes[0])
+                response = self.request(
+                    'post', model, [self.ids[0], self.ids[1], missing]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), [
+                    {'id': self.ids[0], 'status': 'exists'},
+                    {'id': self.ids[1], 'status': 'created'},
+                    {'id': missing, 'status': 'not_found'},
+                ])
+                self.assertEqual(
+                    model.objects.filter(user=self.user).count(), 2
+                )
+
+    def test_remove_outcomes(self):
+        missing = max(self.ids) + 1
+        for model in ENDPOINTS:
+            with self.subTest(model=model.__name__):
+                model.objects.create(user=self.user, recipe=self.recipes[0])
+                response = self.request(
+                    'delete', model, [self.ids[0], self.ids[1], missing]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), [
+                    {'id': self.ids[0], 'status': 'deleted'},
+                    {'id': self.ids[1], 'status': 'missing'},
+                    {'id': missing, 'status': 'not_found'},
+                ])
+                self.assertFalse(
+                    model.objects.filter(user=self.user).exists()
+                )
+
+    def test_remove_keeps_other_users_rows(self):
+        other = create_user()
+        Favorite.objects.create(user=other, recipe=self.recipes[0])
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.request('delete', Favorite, [self.ids[0]])
+        self.assertTrue(Favorite.objects.filter(user=other).exists())
+        self.assertEqual(
+            Recipe.objects.get(pk=self.ids[0]).favorites_count, 1
+        )
+
+    def test_duplicate_ids_are_reported_once(self):
+        response = self.request('post', Favorite, [self.ids[0]] * 3)
+        self.assertEqual(
+            response.json(), [{'id': self.ids[0], 'status': 'created'}]
+        )
+
+    def test_ids_are_capped(self):
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                response = self.request(
+                    method, Favorite, list(range(1, 102))
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes', response.json())
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_empty_list_is_rejected(self):
+        response = self.request('post', Favorite, [])
+        self.assertEqual(response.status_code, 400)
+
+    def test_counters(self):
+        self.request('post', ShoppingCart, self.ids[:10])
+        self.assertEqual(
+            Recipe.objects.filter(in_carts_count=1).count(), 10
+        )
+        self.request('delete', ShoppingCart, self.ids[:5])
+        self.assertEqual(
+            Recipe.objects.filter(in_carts_count=1).count(), 5
+        )
+
+    def test_query_count_does_not_depend_on_size(self):
+        for model in ENDPOINTS:
+            with self.subTest(model=model.__name__):
+                single = [
+                    self.count_queries(method, model, self.ids[:1])
+                    for method in ('post', 'delete')
+                ]
+                full = [
+                    self.count_queries(method, model, self.ids)
+                    for method in ('post', 'delete')
+                ]
+                self.assertEqual(single, full)
+                self.assertFalse(
+                    model.objects.filter(user=self.user).exists()
+                )
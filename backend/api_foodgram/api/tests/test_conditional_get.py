@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .factories import create_ingredients, create_tag
+
+
+@override_settings(CONDITIONAL_GET=True)
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_tag()
+        create_tag()
+        create_ingredients(5, prefix='соль')
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_not_modified_without_queries(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_tags_not_modified(self):
+        self.assert_not_modified_without_queries('/api/tags/')
+
+    def test_ingredients_not_modified(self):
+        self.assert_not_modified_without_queries('/api/ingredients/')
+
+    def test_ingredient_search_not_modified(self):
+        self.assert_not_modified_without_queries('/api/ingredients/?name=со')
+
+    def test_change_invalidates_etag(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        create_tag()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(CONDITIONAL_GET=False)
+    def test_disabled_without_shared_cache(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('ETag', response)
+        self.assertIn('no-cache', response['Cache-Control'])
@@ -0,0 +1,105 @@
+from base64 import b64encode
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.images import process_recipe_image
+from recipes.models import Recipe
+
+from .factories import (client_for, create_ingredients, create_tag,
+                        create_user, get_image_data)
+from .test_storage import TemporaryMediaMixin
+
+
+@override_settings(IMAGE_WORKERS=0)
+class RecipeImageTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.tag = create_tag()
+        cls.ingredient, = create_ingredients(1)
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(self.user)
+
+    def post(self, image, execute=True):
+        with self.captureOnCommitCallbacks(execute=execute):
+            return self.client.post('/api/recipes/', {
+                'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+                'image': image, 'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            }, format='json')
+
+    def assert_rejected(self, image):
+        response = self.post(image)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(self.list_files(), [])
+
+    def test_oversized_upload_is_rejected(self):
+        image = get_image_data(size=(64, 64))
+        with override_settings(IMAGE_MAX_UPLOAD_SIZE=len(image) // 2):
+            self.assert_rejected(image)
+
+    def test_malformed_base64_is_rejected(self):
+        self.assert_rejected('data:image/png;base64,не base64')
+        self.assert_rejected('data:image/png;base64,')
+        self.assert_rejected('data:text/plain;base64,aGVsbG8=')
+
+    def test_non_image_data_is_rejected(self):
+        self.assert_rejected(
+            'data:image/png;base64,' + b64encode(b'not an image').decode()
+        )
+
+    def test_thumbnails_before_processing(self):
+        response = self.post(get_image_data(), execute=False)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(
+            set(data['thumbnails']), set(settings.IMAGE_THUMBNAIL_SIZES)
+        )
+        self.assertEqual(set(data['thumbnails'].values()), {data['image']})
+
+    def test_thumbnails_after_processing(self):
+        response = self.post(get_image_data(size=(2000, 1000)))
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get()
+        self.assertTrue(recipe.image_ready)
+        with default_storage.open(recipe.image.name) as file:
+            self.assertEqual(
+                Image.open(file).size, (settings.IMAGE_MAX_SIDE, 800)
+            )
+        data = self.client.get(f'/api/recipes/{recipe.pk}/').json()
+        self.assertEqual(data['image'].rsplit('/media/', 1)[1],
+                         recipe.image.name)
+        for size, side in settings.IMAGE_THUMBNAIL_SIZES.items():
+            with self.subTest(size=size):
+                name = data['thumbnails'][size].rsplit('/media/', 1)[1]
+                self.assertIn('/thumbnails/', name)
+                with default_storage.open(name) as file:
+                    self.assertEqual(Image.open(file).size[0], side)
+
+    def test_processing_keeps_newer_upload(self):
+        self.post(get_image_data('red'), execute=False)
+        recipe = Recipe.objects.get()
+        stale = recipe.image.name
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {'image': get_image_data('blue')}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        current = recipe.image.name
+        self.assertNotEqual(current, stale)
+        process_recipe_image(recipe.pk, stale)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, current)
+        self.assertFalse(recipe.image_ready)
+        process_recipe_image(recipe.pk, current)
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_ready)
+        self.assertNotEqual(recipe.image.name, current)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from api.caches import IngredientIndex, get_similarity, get_trigrams
+from recipes.models import Ingredient
+
+NAMES = (
+    'salt', 'Salt', 'salt sea', 'sea salt', 'rock salt', 'saltwater',
+    'unsalted butter', 'Salted caramel', 'basalt', 'pepper',
+)
+QUERIES = ('salt', 'SALT', 'sal', 'alt', 'sea', 'pepper', 'x')
+
+
+def has_pg_trgm():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        )
+        return cursor.fetchone() is not None
+
+
+class IngredientIndexTests(TestCase):
+    def setUp(self):
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': 'г'}
+            for pk, name in enumerate(NAMES)
+        ]
+
+    def search(self, value, trigram):
+        return [
+            item['name']
+            for item in IngredientIndex(self.items, trigram).search(value)
+        ]
+
+    def test_similarity_matches_pg_trgm(self):
+        self.assertAlmostEqual(
+            get_similarity(get_trigrams('word'), 'two words'), 4 / 11
+        )
+        self.assertEqual(get_similarity(get_trigrams('salt'), 'SALT'), 1)
+        self.assertEqual(get_similarity(get_trigrams('salt'), '!'), 0)
+
+    def test_groups_ordered_by_name(self):
+        self.assertEqual(self.search('salt', trigram=False), [
+            'Salt', 'salt',
+            'Salted caramel', 'salt sea', 'saltwater',
+            'basalt', 'rock salt', 'sea salt', 'unsalted butter',
+        ])
+
+    def test_groups_ordered_by_similarity(self):
+        self.assertEqual(self.search('salt', trigram=True), [
+            'Salt', 'salt',
+            'salt sea', 'saltwater', 'Salted caramel',
+            'sea salt', 'rock salt', 'basalt', 'unsalted butter',
+        ])
+
+
+class IngredientIndexParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in NAMES
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_names(self, value):
+        response = self.client.get('/api/ingredients/', {'name': value})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_index_matches_filter(self):
+        for value in QUERIES:
+            with self.subTest(value=value):
+                with override_settings(INGREDIENT_SEARCH_INDEX=False):
+                    expected = self.get_names(value)
+                with override_settings(INGREDIENT_SEARCH_INDEX=True):
+                    self.assertEqual(self.get_names(value), expected)
+
+    def test_similarity_matches_database(self):
+        if not has_pg_trgm():
+            self.skipTest('Нужен PostgreSQL с расширением pg_trgm')
+        with connection.cursor() as cursor:
+            for value in QUERIES:
+                trigrams = get_trigrams(value)
+                for name in NAMES:
+                    cursor.execute(
+                        'SELECT similarity(%s, %s)', (name, value)
+                    )
+                    with self.subTest(value=value, name=name):
+                        self.assertAlmostEqual(
+                            get_similarity(trigrams, name),
+                            cursor.fetchone()[0], places=6
+                        )
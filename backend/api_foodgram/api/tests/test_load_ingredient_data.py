@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipIf
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from api.management.commands.load_ingredient_data import (DEFAULT_PATHS,
+                                                          read_json)
+from recipes.models import Ingredient
+
+INGREDIENTS = [
+    {'name': f'ингредиент {number}', 'measurement_unit': 'г'}
+    for number in range(50)
+]
+
+
+class ReadJsonTests(TestCase):
+    def test_small_chunks(self):
+        content = json.dumps(INGREDIENTS, ensure_ascii=False, indent=2)
+        expected = [
+            (item['name'], item['measurement_unit']) for item in INGREDIENTS
+        ]
+        for chunk_size in (1, 7, 64, len(content)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    list(read_json(StringIO(content), chunk_size)), expected
+                )
+
+    def test_empty_list(self):
+        self.assertEqual(list(read_json(StringIO(' [ ] '))), [])
+
+
+class LoadIngredientDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.csv = self.write('ingredients.csv', ''.join(
+            f'{item["name"]},{item["measurement_unit"]}\n'
+            for item in INGREDIENTS[:30]
+        ))
+        self.json = self.write(
+            'ingredients.json',
+            json.dumps(INGREDIENTS[20:], ensure_ascii=False)
+        )
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, *args):
+        stdout = StringIO()
+        call_command('load_ingredient_data', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_csv_and_json_are_deduplicated(self):
+        output = self.load(self.csv, self.json, '--batch-size', '7')
+        self.assertEqual(Ingredient.objects.count(), 50)
+        self.assertIn('Добавлено 50 из 50 ингредиентов', output)
+        self.assertIn('Обработано 7 строк', output)
+
+    def test_rerun_skips_existing_rows(self):
+        self.load(self.csv)
+        output = self.load(self.csv, self.json)
+        self.assertEqual(Ingredient.objects.count(), 50)
+        self.assertIn('Добавлено 20 из 50 ингредиентов', output)
+        output = self.load(self.csv, self.json)
+        self.assertIn('Добавлено 0 из 50 ингредиентов', output)
+
+    def test_dry_run(self):
+        output = self.load(self.csv, self.json, '--dry-run')
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertIn('Найдено 50 уникальных ингредиентов', output)
+
+    def test_invalid_json_rolls_back(self):
+        broken = self.write('broken.json', '[{"name": "соль", "measur')
+        with self.assertRaisesMessage(CommandError, 'Некорректный JSON'):
+            self.load(self.csv, broken)
+        self.assertFalse(Ingredient.objects.exists())
+
+    @skipIf(connection.vendor == 'postgresql', 'COPY доступен')
+    def test_copy_requires_postgresql(self):
+        with self.assertRaisesMessage(CommandError, '--copy'):
+            self.load(self.csv, '--copy')
+
+    @skipIf(connection.vendor != 'postgresql', 'Нужен PostgreSQL')
+    def test_copy(self):
+        self.load(self.csv, '--copy')
+        output = self.load(
+            self.csv, self.json, '--copy', '--batch-size', '7'
+        )
+        self.assertEqual(Ingredient.objects.count(), 50)
+        self.assertIn('Добавлено 20 из 50 ингредиентов', output)
+
+    def test_unknown_format(self):
+        with self.assertRaisesMessage(CommandError, 'Неизвестный формат'):
+            self.load(self.write('ingredients.txt', ''))
+
+    def test_bundled_files(self):
+        self.load(*DEFAULT_PATHS)
+        with open(DEFAULT_PATHS[1], encoding='utf-8') as file:
+            expected = {
+                (item['name'], item['measurement_unit'])
+                for item in json.load(file)
+            }
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            expected
+        )
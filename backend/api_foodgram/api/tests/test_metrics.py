@@ -0,0 +1,111 @@
+import re
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from api import metrics
+from api.metrics import RequestMetrics, get_fingerprint, render_metrics
+from recipes.models import ShoppingCart
+
+from .factories import (client_for, create_ingredients, create_recipe,
+                        create_tag, create_user)
+
+
+def execute(sql, params, many, context):
+    return None
+
+
+class QueryMetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_tag()
+        cls.user = create_user()
+        cls.admin = create_user(is_staff=True)
+
+    def setUp(self):
+        patcher = mock.patch.dict(metrics._views, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_timing(self, response):
+        return dict(
+            re.match(r'(\w+);dur=([\d.]+)', entry.strip()).groups()
+            for entry in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tags/')
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        timing = self.get_timing(response)
+        self.assertEqual(set(timing), {'db', 'app', 'total'})
+        self.assertTrue(all(float(value) >= 0 for value in timing.values()))
+
+    def test_view_summaries(self):
+        for _ in range(3):
+            self.client.get('/api/tags/')
+        text = render_metrics()
+        self.assertIn(
+            'api_request_queries_count{view="TagViewSet.list"} 3', text
+        )
+        self.assertIn(
+            'api_request_queries_sum{view="TagViewSet.list"} 3', text
+        )
+        self.assertIn(
+            'api_request_app_seconds{quantile="0.5",view="TagViewSet.list"}',
+            text
+        )
+
+    def test_streaming_response_is_recorded_after_body(self):
+        recipe = create_recipe(
+            create_user(), ingredients=create_ingredients(2)
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        response = client_for(self.user).get(
+            '/api/recipes/download_shopping_cart/'
+        )
+        view = 'RecipeViewSet.download_shopping_cart'
+        self.assertNotIn(view, metrics._views)
+        b''.join(response.streaming_content)
+        self.assertEqual(metrics._views[view].count, 1)
+        self.assertEqual(list(metrics._views[view].samples['queries']), [2])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(metrics._views)
+
+    @override_settings(METRICS_MAX_FINGERPRINTS=2)
+    def test_duplicate_fingerprints_are_capped(self):
+        queries = [f'SELECT {number}' for number in range(3)]
+        request_metrics = RequestMetrics()
+        request_metrics.start_view('View.list')
+        for sql in queries + queries + queries[:1]:
+            request_metrics(execute, sql, (), False, {})
+        with self.assertLogs('api.metrics', 'WARNING') as logs:
+            request_metrics.record(request_metrics.get_timings())
+        self.assertEqual(len(logs.records), 2)
+        duplicates = metrics._views['View.list'].duplicates
+        self.assertEqual(duplicates, {
+            get_fingerprint(queries[0]): 2,
+            get_fingerprint(queries[1]): 1,
+        })
+        request_metrics.record(request_metrics.get_timings())
+        self.assertEqual(duplicates[get_fingerprint(queries[0])], 4)
+        self.assertNotIn(get_fingerprint(queries[2]), duplicates)
+
+    def test_metrics_view_requires_admin(self):
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 401)
+        response = client_for(self.user).get('/api/_metrics/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_view(self):
+        self.client.get('/api/tags/')
+        response = client_for(self.admin).get('/api/_metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds summary', text)
+        self.assertIn('view="TagViewSet.list"', text)
+        self.assertIn('api_recipe_list_cache_total{result="hits"}', text)
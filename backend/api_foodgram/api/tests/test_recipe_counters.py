@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .factories import client_for, create_recipe, create_user
+
+
+class RecipeCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.recipe = create_recipe(create_user())
+        cls.admin = create_user(is_staff=True, is_superuser=True)
+
+    def assert_counters(self, favorites, carts):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, favorites)
+        self.assertEqual(self.recipe.in_carts_count, carts)
+
+    def test_api(self):
+        client = client_for(self.user)
+        client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        client.post(f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assert_counters(1, 1)
+        client.delete(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assert_counters(0, 1)
+
+    def test_api_bulk(self):
+        client = client_for(self.user)
+        data = {'recipes': [self.recipe.pk]}
+        client.post('/api/recipes/favorite/bulk/', data, format='json')
+        self.assert_counters(1, 0)
+        client.delete('/api/recipes/favorite/bulk/', data, format='json')
+        self.assert_counters(0, 0)
+
+    def test_admin_add_and_delete(self):
+        self.client.force_login(self.admin)
+        self.client.post('/admin/recipes/favorite/add/', {
+            'user': self.user.pk, 'recipe': self.recipe.pk,
+        })
+        self.assert_counters(1, 0)
+        favorite = Favorite.objects.get()
+        self.client.post(
+            f'/admin/recipes/favorite/{favorite.pk}/delete/', {'post': 'yes'}
+        )
+        self.assert_counters(0, 0)
+
+    def test_admin_bulk_delete(self):
+        carts = [
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+            for user in (self.user, self.admin)
+        ]
+        self.assert_counters(0, 2)
+        self.client.force_login(self.admin)
+        self.client.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [cart.pk for cart in carts],
+        })
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assert_counters(0, 0)
+
+    def test_user_delete(self):
+        for user in (self.user, self.admin):
+            Favorite.objects.create(user=user, recipe=self.recipe)
+        self.user.delete()
+        self.assert_counters(1, 0)
+
+    def test_recipe_delete(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.recipe.delete()
+        self.assertFalse(Favorite.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+class ConcurrentRecipeCountersTests(TransactionTestCase):
+    workers = 10
+
+    def test_parallel_favorites(self):
+        recipe = create_recipe(create_user())
+        clients = [client_for(create_user()) for _ in range(self.workers)]
+
+        def favorite(client):
+            try:
+                return client.post(
+                    f'/api/recipes/{recipe.pk}/favorite/'
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            statuses = list(executor.map(favorite, clients))
+        self.assertEqual(statuses, [201] * self.workers)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, self.workers
+        )
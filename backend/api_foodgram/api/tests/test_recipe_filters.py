@@ -0,0 +1,62 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .factories import create_recipe, create_tag, create_user
+
+
+@override_settings(RECIPE_LIST_CACHE_TIMEOUT=0)
+class RecipeTagsFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user()
+        cls.breakfast, cls.lunch, cls.dinner = (
+            create_tag(slug=slug) for slug in ('breakfast', 'lunch', 'dinner')
+        )
+        cls.both = create_recipe(author, tags=[cls.breakfast, cls.lunch])
+        cls.breakfast_only = create_recipe(author, tags=[cls.breakfast])
+        cls.lunch_only = create_recipe(author, tags=[cls.lunch])
+        cls.dinner_only = create_recipe(author, tags=[cls.dinner])
+        cls.untagged = create_recipe(author)
+
+    def get_ids(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/recipes/?limit=50&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']], len(
+            queries
+        )
+
+    def test_any_mode(self):
+        ids, _ = self.get_ids('tags=breakfast&tags=lunch')
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), {
+            self.both.pk, self.breakfast_only.pk, self.lunch_only.pk
+        })
+
+    def test_all_mode(self):
+        ids, _ = self.get_ids('tags=breakfast&tags=lunch&tags_mode=all')
+        self.assertEqual(ids, [self.both.pk])
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get('/api/recipes/?tags=missing')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_depend_on_tags(self):
+        for mode, tags in (('any', 3), ('all', 2)):
+            with self.subTest(mode=mode):
+                _, one = self.get_ids(f'tags=breakfast&tags_mode={mode}')
+                _, many = self.get_ids('&'.join((
+                    *(f'tags={tag.slug}' for tag in (
+                        self.breakfast, self.lunch, self.dinner
+                    )[:tags]),
+                    f'tags_mode={mode}',
+                )))
+                self.assertEqual(one, many)
+
+    def test_new_tag_is_filterable(self):
+        self.get_ids('tags=breakfast')
+        brunch = create_tag(slug='brunch')
+        recipe = create_recipe(create_user(), tags=[brunch])
+        ids, _ = self.get_ids('tags=brunch')
+        self.assertEqual(ids, [recipe.pk])
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.paginators import RecipeCursorPagination
+from recipes.models import Favorite
+
+from .factories import (client_for, create_ingredients, create_recipe,
+                        create_tag, create_user)
+
+URLS = (
+    '/api/recipes/?limit=10',
+    f'/api/recipes/?limit=10&{RecipeCursorPagination.cursor_query_param}=',
+)
+
+
+@override_settings(RECIPE_LIST_CACHE_TIMEOUT=0)
+class RecipeListQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.tags = [create_tag(), create_tag()]
+        cls.ingredients = create_ingredients(3)
+
+    def add_recipes(self, size):
+        for _ in range(size):
+            recipe = create_recipe(
+                create_user(), tags=self.tags, ingredients=self.ingredients
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def assert_constant_queries(self, client):
+        self.add_recipes(1)
+        small = {url: self.count_queries(client, url) for url in URLS}
+        self.add_recipes(9)
+        for url in URLS:
+            with self.subTest(url=url):
+                large, results = self.count_queries(client, url)
+                self.assertEqual(len(results), 10)
+                self.assertEqual(large, small[url][0])
+                for recipe in results:
+                    self.assertEqual(len(recipe['tags']), 2)
+                    self.assertEqual(len(recipe['ingredients']), 3)
+        return results
+
+    def test_anonymous(self):
+        self.assert_constant_queries(self.client)
+
+    def test_authenticated(self):
+        results = self.assert_constant_queries(client_for(self.user))
+        self.assertTrue(all(recipe['is_favorited'] for recipe in results))
+
+
+@override_settings(RECIPE_LIST_CACHE_TIMEOUT=0)
+class RecipeCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user()
+        cls.recipes = [create_recipe(author) for _ in range(7)]
+        now = timezone.now()
+        for index, recipe in enumerate(cls.recipes):
+            recipe.pub_date = now - timedelta(days=index % 3)
+            recipe.save(update_fields=['pub_date'])
+        cls.expected = [
+            recipe.pk for recipe in sorted(
+                cls.recipes, key=lambda recipe: (recipe.pub_date, recipe.pk),
+                reverse=True
+            )
+        ]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_ids(self, data):
+        return [recipe['id'] for recipe in data['results']]
+
+    def test_walk_next_and_previous_with_equal_pub_dates(self):
+        data = self.get('/api/recipes/', cursor='', limit=2)
+        self.assertIsNone(data['previous'])
+        pages = [self.get_ids(data)]
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append(self.get_ids(data))
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        backward = [self.get_ids(data)]
+        while data['previous']:
+            data = self.get(data['previous'])
+            backward.append(self.get_ids(data))
+        self.assertEqual(backward, pages[::-1])
+        self.assertIsNotNone(data['next'])
+
+    def test_cursor_takes_precedence_over_page(self):
+        data = self.get('/api/recipes/', cursor='', page=2, limit=2)
+        self.assertNotIn('count', data)
+        self.assertEqual(self.get_ids(data), self.expected[:2])
+        data = self.get(data['next'])
+        self.assertEqual(self.get_ids(data), self.expected[2:4])
+        self.assertIn('page=2', data['previous'])
+
+    def test_ordering_falls_back_to_pages(self):
+        data = self.get(
+            '/api/recipes/', cursor='', page=2, limit=2, ordering='-pub_date'
+        )
+        self.assertEqual(data['count'], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'не курсор'})
+        self.assertEqual(response.status_code, 404)
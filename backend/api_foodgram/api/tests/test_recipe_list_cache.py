@@ -0,0 +1,150 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.caches import get_recipe_list_metrics
+from recipes.models import Favorite, ShoppingCart
+
+from .factories import (client_for, create_ingredients, create_recipe,
+                        create_tag, create_user, get_image_data)
+from .test_storage import TemporaryMediaMixin
+
+URL = '/api/recipes/'
+
+
+@override_settings(RECIPE_LIST_CACHE_TIMEOUT=300, IMAGE_WORKERS=0)
+class RecipeListCacheTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user()
+        cls.tag = create_tag()
+        cls.ingredients = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(
+                cls.author, tags=[cls.tag], ingredients=cls.ingredients
+            )
+            for _ in range(3)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get(self, client=None, **params):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_hit_runs_no_queries(self):
+        data, misses = self.get()
+        cached, hits = self.get()
+        self.assertEqual(cached, data)
+        self.assertEqual(hits, 0)
+        self.assertGreater(misses, 0)
+        self.assertEqual(
+            get_recipe_list_metrics(),
+            {'hits': 1, 'misses': 1, 'evictions': 0}
+        )
+
+    def test_params_are_normalized(self):
+        self.get(tags=[self.tag.slug], limit=2)
+        _, queries = self.get(limit=2, tags=[self.tag.slug, self.tag.slug])
+        self.assertEqual(queries, 0)
+        _, queries = self.get(limit=1)
+        self.assertGreater(queries, 0)
+
+    def test_unknown_params_bypass_cache(self):
+        self.get(ordering='-favorites_count')
+        self.get(ordering='-favorites_count')
+        self.assertEqual(
+            get_recipe_list_metrics(),
+            {'hits': 0, 'misses': 0, 'evictions': 0}
+        )
+
+    def test_user_flags_are_overlaid(self):
+        self.get()
+        user = create_user()
+        Favorite.objects.create(user=user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=self.recipes[1])
+        data, _ = self.get(client_for(user))
+        self.assertEqual(get_recipe_list_metrics()['hits'], 1)
+        flags = {
+            recipe['id']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart']
+            )
+            for recipe in data['results']
+        }
+        self.assertEqual(flags, {
+            self.recipes[0].pk: (True, False),
+            self.recipes[1].pk: (False, True),
+            self.recipes[2].pk: (False, False),
+        })
+        data, _ = self.get()
+        self.assertFalse(any(
+            recipe['is_favorited'] or recipe['is_in_shopping_cart']
+            for recipe in data['results']
+        ))
+
+    def test_create_update_delete_invalidate(self):
+        client = client_for(self.author)
+        self.get()
+        response = client.post(URL, {
+            'name': 'Новый', 'text': 'Описание', 'cooking_time': 5,
+            'image': get_image_data(), 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.json()['id']
+        data, _ = self.get()
+        self.assertEqual(data['results'][0]['id'], recipe_id)
+        self.assertEqual(get_recipe_list_metrics()['evictions'], 1)
+        client.patch(
+            f'{URL}{recipe_id}/', {'name': 'Изменённый'}, format='json'
+        )
+        data, _ = self.get()
+        self.assertEqual(data['results'][0]['name'], 'Изменённый')
+        client.delete(f'{URL}{recipe_id}/')
+        data, _ = self.get()
+        self.assertNotIn(
+            recipe_id, [recipe['id'] for recipe in data['results']]
+        )
+
+    def test_ingredient_change_invalidates(self):
+        self.get()
+        self.ingredients[0].name = 'Переименованный'
+        self.ingredients[0].save()
+        data, queries = self.get()
+        self.assertGreater(queries, 0)
+        self.assertIn('Переименованный', [
+            ingredient['name']
+            for ingredient in data['results'][0]['ingredients']
+        ])
+
+    def test_author_change_invalidates(self):
+        self.get()
+        self.author.first_name = 'Другое'
+        self.author.save()
+        data, _ = self.get()
+        self.assertEqual(
+            data['results'][0]['author']['first_name'], 'Другое'
+        )
+
+    def test_other_user_changes_keep_cache(self):
+        self.get()
+        create_user()
+        self.client.force_login(self.author)
+        _, queries = self.get(client_for())
+        self.assertEqual(queries, 0)
+
+    def test_key_includes_host(self):
+        data, _ = self.get()
+        response = self.client.get(URL, HTTP_HOST='localhost')
+        self.assertEqual(get_recipe_list_metrics()['hits'], 0)
+        image = response.json()['results'][0]['image']
+        self.assertTrue(image.startswith('http://localhost/'))
+        self.assertTrue(
+            data['results'][0]['image'].startswith('http://testserver/')
+        )
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.services import get_shopping_list_rows
+from recipes.models import IngredientWithWT, ShoppingCart
+
+from .factories import (client_for, create_ingredients, create_recipe,
+                        create_tag, create_user, get_image_data)
+
+
+class RecipeWriteQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root, IMAGE_WORKERS=0
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.tags = [create_tag(), create_tag()]
+        cls.ingredients = create_ingredients(100)
+        cls.image = get_image_data()
+
+    def create_recipe(self, size):
+        client = client_for(self.user)
+        data = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'image': self.image, 'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': index}
+                for index, ingredient in enumerate(
+                    self.ingredients[:size], 1
+                )
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()['ingredients']), size)
+        self.assertEqual(
+            IngredientWithWT.objects.filter(
+                recipe=response.json()['id']
+            ).count(),
+            size
+        )
+        return len(queries)
+
+    def test_create_query_count_does_not_depend_on_ingredients(self):
+        self.assertEqual(self.create_recipe(1), self.create_recipe(100))
+
+    def test_update_writes_only_changed_rows(self):
+        recipe = create_recipe(
+            self.user, tags=self.tags, ingredients=self.ingredients[:50]
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        ingredients = [
+            {'id': ingredient.pk, 'amount': index}
+            for index, ingredient in enumerate(self.ingredients[:50], 1)
+        ]
+        ingredients[10]['amount'] = 1000
+        changed = IngredientWithWT.objects.get(
+            recipe=recipe, ingredient=self.ingredients[10]
+        )
+        table = IngredientWithWT._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = client_for(self.user).patch(
+                f'/api/recipes/{recipe.pk}/',
+                {'ingredients': ingredients}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        writes = [
+            query['sql'] for query in queries if table in query['sql'] and (
+                query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            )
+        ]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+        self.assertTrue(writes[0].endswith(f'IN ({changed.pk})'), writes[0])
+        amounts = {
+            item['id']: item['amount']
+            for item in response.json()['ingredients']
+        }
+        self.assertEqual(len(amounts), 50)
+        self.assertEqual(amounts[self.ingredients[10].pk], 1000)
+        self.assertEqual(amounts[self.ingredients[11].pk], 12)
+        rows = {
+            row['name']: row['amount']
+            for row in get_shopping_list_rows(self.user)
+        }
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[self.ingredients[10].name], 1000)
+        self.assertEqual(rows[self.ingredients[0].name], 1)
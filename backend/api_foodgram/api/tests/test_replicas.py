@@ -0,0 +1,147 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.middleware import ReplicaReadMiddleware
+from api.replicas import PrimaryReplicaRouter, read_database, read_from
+from recipes.models import Recipe
+
+REPLICA = 'replica_1'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_reads_outside_replica_context_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_reads_use_replica(self):
+        with read_from(REPLICA):
+            self.assertEqual(self.router.db_for_read(Recipe), REPLICA)
+
+    def test_token_reads_use_primary(self):
+        with read_from(REPLICA):
+            self.assertEqual(
+                self.router.db_for_read(Token), DEFAULT_DB_ALIAS
+            )
+
+    def test_reads_in_transaction_use_primary(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        with read_from(REPLICA), mock.patch.object(
+            connection, 'in_atomic_block', True
+        ):
+            self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_instance_keeps_its_database(self):
+        recipe = Recipe()
+        recipe._state.db = DEFAULT_DB_ALIAS
+        with read_from(REPLICA):
+            self.assertEqual(
+                self.router.db_for_read(Recipe, instance=recipe),
+                DEFAULT_DB_ALIAS
+            )
+
+    def test_writes_and_migrations_use_primary(self):
+        with read_from(REPLICA):
+            self.assertEqual(
+                self.router.db_for_write(Recipe), DEFAULT_DB_ALIAS
+            )
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'recipes'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_LAG=5)
+class ReplicaReadMiddlewareTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def setUp(self):
+        cache.clear()
+
+    def call(self, request, status=200):
+        seen = []
+
+        def get_response(request):
+            seen.append(read_database.get())
+            return HttpResponse(status=status)
+
+        ReplicaReadMiddleware(get_response)(request)
+        return seen[0]
+
+    def get(self, token='first'):
+        return self.call(
+            self.factory.get('/', HTTP_AUTHORIZATION=f'Token {token}')
+        )
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.get(), REPLICA)
+        self.assertEqual(self.call(self.factory.get('/')), REPLICA)
+
+    def test_writes_use_primary(self):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token first')
+        self.assertIsNone(self.call(request, status=201))
+
+    def test_write_pins_client_to_primary(self):
+        self.call(
+            self.factory.post('/', HTTP_AUTHORIZATION='Token first'),
+            status=201
+        )
+        self.assertIsNone(self.get('first'))
+        self.assertEqual(self.get('second'), REPLICA)
+
+    def test_failed_write_does_not_pin(self):
+        self.call(
+            self.factory.post('/', HTTP_AUTHORIZATION='Token first'),
+            status=400
+        )
+        self.assertEqual(self.get('first'), REPLICA)
+
+    def test_no_pin_without_lag(self):
+        with override_settings(DATABASE_REPLICA_LAG=0):
+            self.call(
+                self.factory.post('/', HTTP_AUTHORIZATION='Token first'),
+                status=201
+            )
+        self.assertEqual(self.get('first'), REPLICA)
+
+    def test_new_token_is_read_from_primary(self):
+        self.call(self.factory.post('/api/auth/token/login/'), status=200)
+        router = PrimaryReplicaRouter()
+
+        def get_response(request):
+            return HttpResponse(router.db_for_read(Token))
+
+        response = ReplicaReadMiddleware(get_response)(
+            self.factory.get('/', HTTP_AUTHORIZATION='Token new')
+        )
+        self.assertEqual(response.content.decode(), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertIsNone(self.get())
+
+    def test_streaming_response_reads_from_replica(self):
+        def content():
+            yield read_database.get()
+
+        response = ReplicaReadMiddleware(
+            lambda request: StreamingHttpResponse(content())
+        )(self.factory.get('/'))
+        self.assertEqual(b''.join(response.streaming_content), b'replica_1')
+
+    async def test_async_requests(self):
+        seen = []
+
+        async def get_response(request):
+            seen.append(read_database.get())
+            return HttpResponse(status=201)
+
+        middleware = ReplicaReadMiddleware(get_response)
+        headers = {'HTTP_AUTHORIZATION': 'Token first'}
+        await middleware(self.factory.get('/', **headers))
+        await middleware(self.factory.post('/', **headers))
+        await middleware(self.factory.get('/', **headers))
+        self.assertEqual(seen, [REPLICA, None, None])
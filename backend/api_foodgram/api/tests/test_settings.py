@@ -0,0 +1,84 @@
+import os
+import runpy
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+REDIS = 'django.core.cache.backends.redis.RedisCache'
+
+
+def load_settings(**env):
+    with mock.patch.dict(os.environ):
+        for name, value in env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return runpy.run_module('api_foodgram.settings')
+
+
+class ConnectionSettingsTests(SimpleTestCase):
+    unset = dict.fromkeys(
+        ('ASGI', 'DB_CONN_MAX_AGE', 'DB_CONN_HEALTH_CHECKS', 'DB_POOL_MODE')
+    )
+
+    def get_database(self, **env):
+        return load_settings(**{**self.unset, **env})['DATABASES']['default']
+
+    def test_defaults(self):
+        database = self.get_database()
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_asgi_closes_connections(self):
+        settings = load_settings(**{**self.unset, 'ASGI': 'True'})
+        self.assertTrue(settings['ASYNC_VIEWS'])
+        self.assertEqual(settings['DATABASES']['default']['CONN_MAX_AGE'], 0)
+
+    def test_conn_max_age_override(self):
+        self.assertEqual(
+            self.get_database(ASGI='True', DB_CONN_MAX_AGE='30')[
+                'CONN_MAX_AGE'
+            ],
+            30
+        )
+        self.assertEqual(
+            self.get_database(DB_CONN_MAX_AGE='0')['CONN_MAX_AGE'], 0
+        )
+
+    def test_health_checks_can_be_disabled(self):
+        self.assertFalse(
+            self.get_database(DB_CONN_HEALTH_CHECKS='False')[
+                'CONN_HEALTH_CHECKS'
+            ]
+        )
+
+    def test_transaction_pool_mode(self):
+        database = self.get_database(DB_POOL_MODE='transaction')
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+
+
+class ReplicaSettingsTests(SimpleTestCase):
+    def test_replicas(self):
+        settings = load_settings(
+            DB_REPLICA_HOSTS='replica-a;replica-b:6432', CACHE_BACKEND=REDIS
+        )
+        self.assertEqual(
+            settings['DATABASE_REPLICAS'], ['replica_1', 'replica_2']
+        )
+        replica = settings['DATABASES']['replica_2']
+        self.assertEqual((replica['HOST'], replica['PORT']),
+                         ('replica-b', '6432'))
+        self.assertEqual(replica['TEST'], {'MIRROR': 'default'})
+
+    def test_replicas_require_shared_cache(self):
+        with self.assertRaisesMessage(
+            ImproperlyConfigured, 'DB_REPLICA_HOSTS'
+        ):
+            load_settings(
+                DB_REPLICA_HOSTS='replica',
+                CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache'
+            )
@@ -0,0 +1,79 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import ShoppingCart
+
+from .factories import (client_for, create_ingredients, create_recipe,
+                        create_user)
+
+FORMATS = ('txt', 'csv', 'json', 'pdf')
+
+
+class ShoppingListQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user()
+        ingredients = create_ingredients(10)
+        cls.recipes = [
+            create_recipe(author, ingredients=ingredients[index % 5:][:5])
+            for index in range(50)
+        ]
+
+    def download(self, size, format):
+        user = create_user()
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe)
+            for recipe in self.recipes[:size]
+        )
+        client = client_for(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                '/api/recipes/download_shopping_cart/', {'format': format}
+            )
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(content)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for format in FORMATS:
+            with self.subTest(format=format):
+                self.assertEqual(
+                    self.download(1, format), self.download(50, format)
+                )
+
+    def test_amounts_are_summed(self):
+        user = create_user()
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe)
+            for recipe in self.recipes[:2]
+        )
+        response = client_for(user).get(
+            '/api/recipes/download_shopping_cart/', {'format': 'json'}
+        )
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(sum(row['amount'] for row in rows), 2 * 15)
+
+    def assert_json_error(self, response, status_code):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn('Content-Disposition', response)
+        return response.json()
+
+    def test_unauthenticated_error_is_json(self):
+        for format in FORMATS:
+            with self.subTest(format=format):
+                self.assert_json_error(self.client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': format}
+                ), 401)
+
+    def test_unknown_format_error_is_json(self):
+        data = self.assert_json_error(client_for(create_user()).get(
+            '/api/recipes/download_shopping_cart/', {'format': 'xml'}
+        ), 400)
+        self.assertIn('format', data)
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.images import get_processed_name, get_thumbnail_name
+from api.storage import TEMP_PREFIX, ContentAddressedStorage
+
+from .factories import create_recipe, create_user
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def list_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, filename), self.media_root)
+            for directory, _, filenames in os.walk(self.media_root)
+            for filename in filenames
+        )
+
+    def write(self, name, content=b'data', age=0):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+
+class SlowContentFile(ContentFile):
+    def __init__(self, content, barrier):
+        super().__init__(content)
+        self.barrier = barrier
+
+    def chunks(self, chunk_size=None):
+        self.seek(0)
+        yield self.read(len(self) // 2)
+        self.barrier.wait(timeout=5)
+        yield self.read()
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = ContentAddressedStorage(location=self.media_root)
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('images/a.PNG', ContentFile(b'same'))
+        second = self.storage.save('images/b.png', ContentFile(b'same'))
+        other = self.storage.save('images/c.png', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.endswith('.png'))
+        self.assertEqual(self.list_files(), sorted((first, other)))
+
+    def test_duplicate_save_refreshes_mtime(self):
+        name = self.storage.save('images/a.png', ContentFile(b'same'))
+        path = self.storage.path(name)
+        os.utime(path, (0, 0))
+        self.storage.save('images/b.png', ContentFile(b'same'))
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+    def test_concurrent_writes_of_same_blob(self):
+        content = os.urandom(64 * 1024)
+        name = self.storage.get_content_name(
+            'images/a.png', ContentFile(content)
+        )
+        barrier = threading.Barrier(2)
+        with ThreadPoolExecutor(2) as executor:
+            names = list(executor.map(
+                lambda _: self.storage._save(
+                    name, SlowContentFile(content, barrier)
+                ),
+                range(2)
+            ))
+        self.assertEqual(names, [name, name])
+        self.assertEqual(self.list_files(), [name])
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), content)
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        class BrokenFile(ContentFile):
+            def chunks(self, chunk_size=None):
+                yield b'part'
+                raise OSError
+
+        with self.assertRaises(OSError):
+            self.storage._save('images/a.png', BrokenFile(b''))
+        self.assertFalse(any(
+            os.path.basename(name).startswith(TEMP_PREFIX)
+            for name in self.list_files()
+        ))
+
+
+class CollectMediaGarbageTests(TemporaryMediaMixin, TestCase):
+    def collect(self, *args):
+        call_command('collect_media_garbage', *args, stdout=StringIO())
+
+    def test_referenced_blobs_are_kept(self):
+        age = 48 * 3600
+        recipe = create_recipe(create_user(), image='images/used.png')
+        shared = create_recipe(create_user(), image='images/used.png')
+        referenced = [
+            recipe.image.name,
+            get_processed_name(recipe.image.name),
+            *(
+                get_thumbnail_name(get_processed_name(recipe.image.name), size)
+                for size in settings.IMAGE_THUMBNAIL_SIZES
+            ),
+        ]
+        for name in referenced:
+            self.write(name, age=age)
+        orphan = self.write('images/orphan.png', age=age)
+        recent = self.write('images/recent.png')
+        self.collect('--dry-run')
+        self.assertTrue(os.path.exists(orphan))
+        recipe.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent))
+        for name in referenced:
+            self.assertTrue(
+                os.path.exists(os.path.join(self.media_root, name)), name
+            )
+        shared.delete()
+        self.collect()
+        self.assertEqual(self.list_files(), ['images/recent.png'])
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.services import (TRENDING_COMMIT_LAG, TRENDING_REBASE_HALF_LIVES,
+                          refresh_popularity)
+from recipes.models import (Favorite, PopularityState, RecipePopularity,
+                            ShoppingCart)
+
+from .factories import client_for, create_recipe, create_user
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.recipes = [create_recipe(create_user()) for _ in range(10)]
+
+    def get_trending(self):
+        client = client_for(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/trending/?limit=10')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()], len(queries)
+
+    def test_query_count_does_not_depend_on_size(self):
+        RecipePopularity.objects.create(recipe=self.recipes[0], score=1)
+        ids, small = self.get_trending()
+        self.assertEqual(ids, [self.recipes[0].pk])
+        RecipePopularity.objects.bulk_create(
+            RecipePopularity(recipe=recipe, score=1)
+            for recipe in self.recipes[1:]
+        )
+        ids, large = self.get_trending()
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(small, large)
+
+    def test_ordered_by_score_then_newest(self):
+        first, second, third = self.recipes[:3]
+        RecipePopularity.objects.bulk_create((
+            RecipePopularity(recipe=first, score=5),
+            RecipePopularity(recipe=second, score=1),
+            RecipePopularity(recipe=third, score=1),
+        ))
+        ids, _ = self.get_trending()
+        self.assertEqual(ids, [first.pk, third.pk, second.pk])
+
+
+class RefreshPopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = [create_recipe(create_user()) for _ in range(3)]
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def refresh(self, delta=timedelta()):
+        with patch('api.services.timezone.now',
+                   return_value=self.now + delta):
+            return refresh_popularity()
+
+    def add(self, model, recipe, ago, users=1):
+        objects = [
+            model.objects.create(user=create_user(), recipe=recipe)
+            for _ in range(users)
+        ]
+        model.objects.filter(pk__in=[obj.pk for obj in objects]).update(
+            created=self.now - ago
+        )
+
+    def get_scores(self):
+        return dict(
+            RecipePopularity.objects.values_list('recipe_id', 'score')
+        )
+
+    def test_consecutive_refreshes_are_incremental(self):
+        first, second, _ = self.recipes
+        self.add(Favorite, first, timedelta(hours=2), users=2)
+        self.add(ShoppingCart, second, timedelta(hours=2))
+        self.assertEqual(self.refresh(), (3, 2))
+        scores = self.get_scores()
+        self.assertAlmostEqual(scores[first.pk], scores[second.pk])
+        self.assertEqual(self.refresh(timedelta(minutes=1)), (0, 0))
+        self.assertEqual(self.get_scores(), scores)
+        self.add(Favorite, second, -timedelta(minutes=1))
+        self.assertEqual(self.refresh(timedelta(minutes=5)), (1, 1))
+        self.assertGreater(self.get_scores()[second.pk], scores[second.pk])
+        self.assertEqual(self.get_scores()[first.pk], scores[first.pk])
+
+    def test_newer_events_score_higher(self):
+        old, new, _ = self.recipes
+        self.add(Favorite, old, timedelta(hours=25))
+        self.add(Favorite, new, timedelta(hours=1))
+        self.refresh()
+        scores = self.get_scores()
+        self.assertAlmostEqual(scores[new.pk] / scores[old.pk], 2)
+
+    def test_rows_inside_commit_lag_are_counted_once(self):
+        recipe = self.recipes[0]
+        self.add(Favorite, recipe, TRENDING_COMMIT_LAG / 2)
+        self.assertEqual(self.refresh(), (0, 0))
+        self.assertFalse(RecipePopularity.objects.exists())
+        self.add(Favorite, recipe, TRENDING_COMMIT_LAG / 3)
+        self.assertEqual(self.refresh(TRENDING_COMMIT_LAG), (2, 1))
+        self.assertEqual(self.refresh(TRENDING_COMMIT_LAG * 3), (0, 0))
+
+    def test_history_before_first_refresh_is_ignored(self):
+        self.add(Favorite, self.recipes[0], timedelta(days=365))
+        self.assertEqual(self.refresh(), (0, 0))
+
+    def test_rebase(self):
+        first, second, third = self.recipes
+        half_life = timedelta(seconds=settings.TRENDING_HALF_LIFE)
+        age = half_life * TRENDING_REBASE_HALF_LIVES
+        PopularityState.objects.create(
+            epoch=self.now - age, watermark=self.now - timedelta(hours=1)
+        )
+        RecipePopularity.objects.bulk_create((
+            RecipePopularity(recipe=first, score=3 * 2 ** 32),
+            RecipePopularity(recipe=second, score=2 ** 32),
+            RecipePopularity(recipe=third, score=1),
+        ))
+        self.add(Favorite, third, timedelta(hours=1) - TRENDING_COMMIT_LAG)
+        self.assertEqual(self.refresh(), (1, 1))
+        self.assertEqual(PopularityState.objects.get().epoch, self.now)
+        scores = self.get_scores()
+        self.assertAlmostEqual(scores[first.pk], 3)
+        self.assertAlmostEqual(scores[second.pk], 1)
+        self.assertAlmostEqual(scores[third.pk], 1, delta=0.1)
+        self.add(Favorite, second, -timedelta(minutes=1), users=3)
+        self.refresh(timedelta(minutes=5))
+        self.assertGreater(self.get_scores()[second.pk], scores[first.pk])
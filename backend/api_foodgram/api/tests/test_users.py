@@ -0,0 +1,122 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, Subscriptions
+
+from .factories import client_for, create_recipe, create_user
+
+
+class UsersQueriesTests(TestCase):
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def subscribe(self, user, authors, recipes):
+        for author in authors:
+            Subscriptions.objects.create(user=user, author=author)
+            for _ in range(recipes):
+                create_recipe(author)
+
+    def test_users_page(self):
+        user = create_user()
+        client = client_for(user)
+        self.subscribe(user, [create_user()], 0)
+        small, data = self.count_queries(client, '/api/users/')
+        self.assertEqual(len(data['results']), 2)
+        self.subscribe(user, [create_user() for _ in range(5)], 0)
+        large, data = self.count_queries(client, '/api/users/')
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(small, large)
+
+    def test_subscriptions_page(self):
+        user = create_user()
+        client = client_for(user)
+        url = '/api/users/subscriptions/?recipes_limit=2'
+        self.subscribe(user, [create_user()], 1)
+        small, data = self.count_queries(client, url)
+        self.assertEqual(len(data['results']), 1)
+        self.subscribe(user, [create_user() for _ in range(5)], 3)
+        large, data = self.count_queries(client, url)
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(small, large)
+        for author in data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertLessEqual(len(author['recipes']), 2)
+
+
+class SubscriptionsRecipesLimitTests(TestCase):
+    url = '/api/users/subscriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.author = create_user()
+        Subscriptions.objects.create(user=cls.user, author=cls.author)
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='images/recipe.png'
+            )
+            for index in range(2000)
+        )
+        cls.latest = list(
+            cls.author.recipes.values_list('pk', flat=True)[:3]
+        )
+
+    def setUp(self):
+        self.client = client_for(self.user)
+
+    def test_large_author(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'recipes_limit': 3})
+        self.assertEqual(response.status_code, 200)
+        author, = response.json()['results']
+        self.assertEqual(author['recipes_count'], 2000)
+        self.assertEqual(
+            [recipe['id'] for recipe in author['recipes']], self.latest
+        )
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'ROW_NUMBER' in query['sql']
+        ]), 1)
+        Subscriptions.objects.create(user=self.user, author=create_user())
+        with self.assertNumQueries(len(queries)):
+            self.client.get(self.url, {'recipes_limit': 3})
+
+    def test_without_limit(self):
+        response = self.client.get(self.url)
+        author, = response.json()['results']
+        self.assertEqual(len(author['recipes']), 2000)
+
+    def test_invalid_limit(self):
+        for value in ('abc', '-1', '1.5'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    self.url, {'recipes_limit': value}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.json())
+
+    def test_invalid_limit_on_subscribe(self):
+        author = create_user()
+        response = self.client.post(
+            f'/api/users/{author.pk}/subscribe/?recipes_limit=abc'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            Subscriptions.objects.filter(author=author).exists()
+        )
+
+    def test_limit_on_subscribe(self):
+        Subscriptions.objects.all().delete()
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/?recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['recipes']],
+            self.latest
+        )
@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (FavoriteViewSet, IngredientViewSet,
-                    ManageSubscriptionsView, RecipeViewSet,
+                    ManageSubscriptionsView, MetricsView, RecipeViewSet,
                     ShoppingCartViewSet, TagViewSet)
 
 router = DefaultRouter()
@@ -12,9 +12,23 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 
 
 urlpatterns = [
+    path('_metrics/', MetricsView.as_view()),
     path(
         'recipes/download_shopping_cart/',
-        RecipeViewSet.as_view({'get': 'download_shopping_cart'})
+        RecipeViewSet.as_view(
+            {'get': 'download_shopping_cart'},
+            **RecipeViewSet.download_shopping_cart.kwargs
+        )
+    ),
+    path(
+        'recipes/shopping_cart/bulk/',
+        ShoppingCartViewSet.as_view(
+            {'post': 'bulk_add', 'delete': 'bulk_remove'}
+        )
+    ),
+    path(
+        'recipes/favorite/bulk/',
+        FavoriteViewSet.as_view({'post': 'bulk_add', 'delete': 'bulk_remove'})
     ),
     path(
         'recipes/<int:pk>/shopping_cart/',
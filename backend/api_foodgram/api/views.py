@@ -1,28 +1,171 @@
+from copy import deepcopy
+from hashlib import md5
+
+from adrf import viewsets as async_viewsets
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
-                            Subscriptions, Tag)
+from recipes.models import (Favorite, Ingredient, IngredientWithWT, Recipe,
+                            RecipePopularity, ShoppingCart, Subscriptions, Tag)
 
-from .filters import IngredientFilter, RecipeFilter
-from .paginators import PageNumberPagination
+from .caches import (bump_version, get_cached_recipe_list,
+                     get_ingredient_index, get_recipe_list_cache_key,
+                     get_version, set_cached_recipe_list)
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .metrics import render_metrics
+from .paginators import PageNumberPagination, RecipeCursorPagination
 from .permissions import IsAuthor, ReadOnly
-from .serializers import (IngredientSerializer, RecipeReadSerializer,
-                          RecipeWriteSerializer, ReducedRecipeSerializer,
-                          TagSerializer, UsersWithRecipesSerializer)
-from .services import get_shopping_list
+from .renderers import SHOPPING_LIST_RENDERERS, PrometheusRenderer
+from .replicas import is_replica_stale
+from .serializers import (IngredientSerializer, RecipeIdsSerializer,
+                          RecipeReadSerializer, RecipeWriteSerializer,
+                          ReducedRecipeSerializer, TagSerializer,
+                          UsersWithRecipesSerializer, get_recipes_limit)
+from .services import (get_shopping_list_rows, recount_recipe_counter,
+                       set_recipe_user_flags)
 
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class AsyncActionsMixin:
+    view_is_async = settings.ASYNC_VIEWS
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        if not cls.view_is_async or not actions:
+            return super().as_view(actions, **initkwargs)
+        view = super().as_view({
+            method: cls.get_async_action(action)
+            for method, action in actions.items()
+        }, **initkwargs)
+        view.actions = actions
+        return view
+
+    @classmethod
+    def get_async_action(cls, action):
+        return f'a{action}' if action in cls.async_actions else action
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        action = self.action or ''
+        if action.startswith('a') and action[1:] in self.async_actions:
+            self.action = action[1:]
+        return request
+
+
+class ConditionalGetMixin:
+    version_models = ()
+    conditional_actions = ('list', 'retrieve')
+    per_user = True
+    cache_max_age = 0
+
+    def get_validators(self, request):
+        user_id = request.user.pk if self.per_user else None
+        if not settings.CONDITIONAL_GET:
+            return None, None, user_id
+        versions = [get_version(model) for model in self.version_models]
+        etag = quote_etag(md5(repr((
+            versions, user_id, request.accepted_media_type,
+            request.get_full_path(),
+        )).encode()).hexdigest())
+        if is_replica_stale(max(versions)):
+            return None, None, user_id
+        return etag, int(max(versions)), user_id
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        etag, last_modified, user_id = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return self.patch_conditional_headers(
+            response, etag, last_modified, user_id
+        )
+
+    async def aconditional_response(self, request, handler, *args,
+                                    **kwargs):
+        etag, last_modified, user_id = await sync_to_async(
+            self.get_validators
+        )(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+        return self.patch_conditional_headers(
+            response, etag, last_modified, user_id
+        )
+
+    def patch_conditional_headers(self, response, etag, last_modified,
+                                  user_id):
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Accept', ))
+            if self.per_user:
+                patch_vary_headers(response, ('Authorization', ))
+            if user_id is not None:
+                patch_cache_control(response, private=True, no_cache=True)
+            elif self.cache_max_age and etag is not None:
+                patch_cache_control(
+                    response, public=True, max_age=self.cache_max_age
+                )
+            else:
+                patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional_response(
+            request, super().alist, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self.aconditional_response(
+            request, super().aretrieve, *args, **kwargs
+        )
+
+
+class IngredientViewSet(AsyncActionsMixin, ConditionalGetMixin,
+                        async_viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny, )
@@ -30,28 +173,66 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     queryset = Ingredient.objects.all()
+    version_models = (Ingredient, )
+    per_user = False
+    cache_max_age = settings.CATALOG_CACHE_MAX_AGE
+
+    def list(self, request, *args, **kwargs):
+        if not settings.INGREDIENT_SEARCH_INDEX:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, self.search_index)
 
+    async def alist(self, request, *args, **kwargs):
+        if not settings.INGREDIENT_SEARCH_INDEX:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional_response(
+            request, sync_to_async(self.search_index)
+        )
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def search_index(self, request):
+        return Response(
+            get_ingredient_index().search(request.query_params.get('name'))
+        )
+
+
+class TagViewSet(AsyncActionsMixin, ConditionalGetMixin,
+                 async_viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny, )
     queryset = Tag.objects.all()
+    version_models = (Tag, )
+    per_user = False
+    cache_max_age = settings.CATALOG_CACHE_MAX_AGE
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncActionsMixin, ConditionalGetMixin,
+                    async_viewsets.ModelViewSet):
+    version_models = (
+        Recipe, IngredientWithWT, Ingredient, Tag, User,
+        Favorite, ShoppingCart, Subscriptions,
+    )
+    conditional_actions = ('retrieve', )
+    async_actions = ('list', 'retrieve', 'download_shopping_cart')
     pagination_class = PageNumberPagination
+    paginator_query_param = RecipeCursorPagination.cursor_query_param
     permission_classes = (IsAdminUser | IsAuthor | ReadOnly,)
     filterset_class = RecipeFilter
     filterset_fields = (
         'tags', 'is_in_shopping_cart',
         'is_favorited', 'author'
     )
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
 
     def get_queryset(self):
-        queryset = Recipe.objects.prefetch_related(
-            'tags', 'ingredients', 'author'
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientwithwt_set',
+                queryset=IngredientWithWT.objects.select_related('ingredient'),
+                to_attr='ingredient_amounts'
+            )
         )
         if self.request.user.is_authenticated:
             queryset = queryset.annotate(
@@ -70,18 +251,119 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return queryset
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            ordered = RecipeOrderingFilter.ordering_param in query_params
+            if self.paginator_query_param in query_params and not ordered:
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    async def apaginate_queryset(self, queryset):
+        paginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if paginate is None:
+            return await super().apaginate_queryset(queryset)
+        return await paginate(queryset, self.request, view=self)
+
+    def list(self, request, *args, **kwargs):
+        key = get_recipe_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        data, versions = get_cached_recipe_list(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = deepcopy(response.data)
+            set_recipe_user_flags(data['results'])
+            set_cached_recipe_list(key, data, versions)
+            return response
+        set_recipe_user_flags(data['results'], request)
+        return Response(data)
+
+    async def alist(self, request, *args, **kwargs):
+        key = get_recipe_list_cache_key(request)
+        if key is None:
+            return await super().alist(request, *args, **kwargs)
+        data, versions = await sync_to_async(get_cached_recipe_list)(key)
+        if data is None:
+            response = await super().alist(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = deepcopy(response.data)
+            set_recipe_user_flags(data['results'])
+            await sync_to_async(set_cached_recipe_list)(key, data, versions)
+            return response
+        await sync_to_async(set_recipe_user_flags)(data['results'], request)
+        return Response(data)
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        queryset = RecipePopularity.objects.select_related(
+            'recipe'
+        ).order_by('-score', '-recipe_id')
+        serializer = ReducedRecipeSerializer(
+            [
+                popularity.recipe for popularity in
+                queryset[:self.paginator.get_page_size(request)]
+            ],
+            many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        shopping_cart = get_shopping_list(request.user)
-        response = HttpResponse(shopping_cart, 'Content-Type: text/plain')
-        response['Content-Disposition'] = ('attachment; filename='
-                                           '"shopping_cart.txt"')
+        renderer = request.accepted_renderer
+        rows = get_shopping_list_rows(request.user).iterator()
+        return self.get_shopping_list_response(renderer, renderer.stream(rows))
+
+    async def adownload_shopping_cart(self, request):
+        renderer = request.accepted_renderer
+        rows = get_shopping_list_rows(request.user)
+        if not isinstance(request._request, ASGIRequest):
+            return self.get_shopping_list_response(
+                renderer, renderer.stream(rows.iterator())
+            )
+        return self.get_shopping_list_response(
+            renderer, renderer.astream(rows.aiterator())
+        )
+
+    def perform_content_negotiation(self, request, force=False):
+        try:
+            return super().perform_content_negotiation(request, force)
+        except Http404:
+            if self.action != 'download_shopping_cart':
+                raise
+            raise ValidationError(
+                {'format': 'Неизвестный формат списка покупок'}
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.action == 'download_shopping_cart' and isinstance(
+            response, Response
+        ):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_shopping_list_response(self, renderer, content):
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
         return response
 
 
@@ -90,7 +372,27 @@ class ManageSubscriptionsView(viewsets.ModelViewSet):
     serializer_class = UsersWithRecipesSerializer
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc())
+            )).filter(row_number__lte=recipes_limit)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            recipes_count=Count('recipes', distinct=True),
+            is_subscribed=Exists(
+                Subscriptions.objects.filter(
+                    user=self.request.user,
+                    author=OuterRef('pk')
+                )
+            ),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+        )
 
     def get_pagination_class(self):
         if self.request.method == 'GET':
@@ -98,6 +400,7 @@ class ManageSubscriptionsView(viewsets.ModelViewSet):
         return None
 
     def create(self, request, *args, **kwargs):
+        get_recipes_limit(request)
         author = get_object_or_404(User, id=self.kwargs.get('pk'))
         user = request.user
         if author == user:
@@ -144,26 +447,23 @@ class FavoriteShoppingCartMixin(viewsets.ModelViewSet):
         return self.model.objects.filter(user=self.request.user)
 
     def create(self, request, *args, **kwargs):
-        recipe = Recipe.objects.get(pk=self.kwargs['pk'])
-        user = self.request.user
-        obj = self.model.objects.filter(
-            user=user,
-            recipe=recipe
-        )
-        if obj.exists():
+        recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
+        try:
+            with transaction.atomic():
+                self.model.objects.create(
+                    user=self.request.user,
+                    recipe=recipe
+                )
+        except IntegrityError:
             return Response(
                 {'errors': 'Уже добавлено'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        self.model.objects.create(
-            user=self.request.user,
-            recipe=recipe
-        )
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, *args, **kwargs):
-        recipe = Recipe.objects.get(pk=self.kwargs['pk'])
+        recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
         del_count, _ = self.model.objects.filter(
             user=self.request.user,
             recipe=recipe
@@ -175,6 +475,51 @@ class FavoriteShoppingCartMixin(viewsets.ModelViewSet):
             )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_bulk_recipes(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            added=Exists(self.get_queryset().filter(recipe=OuterRef('pk')))
+        ).values_list('pk', 'added'))
+        return {recipe_id: found.get(recipe_id) for recipe_id in recipe_ids}
+
+    def get_bulk_response(self, recipes, outcomes):
+        return Response([
+            {'id': recipe_id, 'status': outcomes[added]}
+            for recipe_id, added in recipes.items()
+        ])
+
+    def bulk_add(self, request, *args, **kwargs):
+        recipes = self.get_bulk_recipes(request)
+        added = [pk for pk, exists in recipes.items() if exists is False]
+        if added:
+            with transaction.atomic():
+                self.model.objects.bulk_create([
+                    self.model(user=request.user, recipe_id=recipe_id)
+                    for recipe_id in added
+                ], ignore_conflicts=True)
+                recount_recipe_counter(self.model, added)
+            bump_version(self.model)
+        return self.get_bulk_response(
+            recipes,
+            {None: 'not_found', False: 'created', True: 'exists'}
+        )
+
+    def bulk_remove(self, request, *args, **kwargs):
+        recipes = self.get_bulk_recipes(request)
+        removed = [pk for pk, exists in recipes.items() if exists]
+        if removed:
+            queryset = self.get_queryset().filter(recipe_id__in=removed)
+            with transaction.atomic():
+                queryset._raw_delete(queryset.db)
+                recount_recipe_counter(self.model, removed)
+            bump_version(self.model)
+        return self.get_bulk_response(
+            recipes,
+            {None: 'not_found', False: 'missing', True: 'deleted'}
+        )
+
 
 class FavoriteViewSet(FavoriteShoppingCartMixin):
     model = Favorite
@@ -182,3 +527,11 @@ class FavoriteViewSet(FavoriteShoppingCartMixin):
 
 class ShoppingCartViewSet(FavoriteShoppingCartMixin):
     model = ShoppingCart
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser, )
+    renderer_classes = (PrometheusRenderer, )
+
+    def get(self, request):
+        return Response(render_metrics())
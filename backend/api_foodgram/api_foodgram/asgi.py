@@ -0,0 +1,36 @@
+"""
+ASGI config for api_foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import asyncio
+import os
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_foodgram.settings')
+
+
+class ConcurrencyLimit:
+    """Queue HTTP requests beyond the limit instead of opening
+    a database connection for each of them."""
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def __call__(self, scope, receive, send):
+        if self.semaphore is None or scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        async with self.semaphore:
+            return await self.app(scope, receive, send)
+
+
+application = ConcurrencyLimit(
+    get_asgi_application(), settings.ASGI_MAX_CONCURRENCY
+)
@@ -1,5 +1,6 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
+    'api.middleware.ReplicaReadMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +72,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'api_foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'api_foodgram.asgi.application'
+
+ASYNC_VIEWS = os.getenv('ASGI', default='False') == 'True'
+
+ASGI_MAX_CONCURRENCY = int(os.getenv('ASGI_MAX_CONCURRENCY', default=40))
+
 
 DATABASES = {
     'default': {
@@ -80,13 +89,115 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='123456'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE', default=0 if ASYNC_VIEWS else 60
+        )),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True'
+        ) == 'True',
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_POOL_MODE', default='session'
+        ) == 'transaction',
+    }
+}
+
+DATABASE_REPLICAS = []
+
+for index, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(';')), 1
+):
+    host, _, port = host.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['api.replicas.PrimaryReplicaRouter']
+
+DATABASE_REPLICA_LAG = float(os.getenv('DB_REPLICA_LAG', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', default=60))
+
+CONDITIONAL_GET = os.getenv(
+    'CONDITIONAL_GET', default=str(SHARED_CACHE)
+) == 'True'
+
+RECIPE_LIST_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_LIST_CACHE_TIMEOUT', default=300 if SHARED_CACHE else 0)
+)
+
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', default=0)
+)
+
+INGREDIENT_SEARCH_INDEX = os.getenv(
+    'INGREDIENT_SEARCH_INDEX', default='False'
+) == 'True'
+
+if INGREDIENT_SEARCH_INDEX and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        'INGREDIENT_SEARCH_INDEX требует общего кэша (CACHE_BACKEND)'
+    )
+
+if DATABASE_REPLICAS and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        'DB_REPLICA_HOSTS требует общего кэша (CACHE_BACKEND)'
+    )
+
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('IMAGE_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024)
+)
+
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', default=1600))
+
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', default='WEBP')
+
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', default=80))
+
+IMAGE_THUMBNAIL_SIZES = {
+    'small': 320,
+    'medium': 640,
+}
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE', default=24 * 3600))
+
+TRENDING_WEIGHTS = {
+    'favorite': float(os.getenv('TRENDING_FAVORITE_WEIGHT', default=1)),
+    'shopping_cart': float(os.getenv('TRENDING_CART_WEIGHT', default=2)),
+}
+
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', default=1))
+
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', default=1000))
+
+METRICS_MAX_FINGERPRINTS = int(
+    os.getenv('METRICS_MAX_FINGERPRINTS', default=50)
+)
+
 
 # Password validation
-# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -115,13 +226,11 @@ TIME_ZONE = 'UTC'
 
 USE_I18N = True
 
-USE_L10N = True
-
 USE_TZ = True
 
 
 # Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/2.2/howto/static-files/
+# https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = '/static/'
 
@@ -131,6 +240,20 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:26
+
+from django.db import migrations
+
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    ('CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+     'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)'),
+    ('CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper '
+     'ON recipes_ingredient (UPPER(name) text_pattern_ops)'),
+)
+
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_upper',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20230731_1751'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
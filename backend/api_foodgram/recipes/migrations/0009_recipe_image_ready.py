@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
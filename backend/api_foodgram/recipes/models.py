@@ -25,6 +25,12 @@ class Ingredient(models.Model):
         return self.name
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='ingredient_constraint'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -41,6 +47,7 @@ class Recipe(models.Model):
         upload_to='images/',
         blank=True,
     )
+    image_ready = models.BooleanField(default=False, editable=False)
     text = models.TextField(verbose_name='Текст')
     cooking_time = models.IntegerField(verbose_name='Время приготовления')
     tags = models.ManyToManyField(
@@ -53,9 +60,33 @@ class Recipe(models.Model):
         related_name='recipe'
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
 
     class Meta:
-        ordering = ['-pub_date', ]
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -99,6 +130,7 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='users_carts'
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -122,6 +154,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='users_favorites'
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -156,3 +189,32 @@ class Subscriptions(models.Model):
         ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class RecipePopularity(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity'
+    )
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'],
+                name='popularity_score_idx'
+            ),
+        ]
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+
+class PopularityState(models.Model):
+    epoch = models.DateTimeField()
+    watermark = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
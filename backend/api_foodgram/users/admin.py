@@ -30,10 +30,9 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (TagsInLine, IngredientWithWTInLine)
     search_fields = ('name',)
     list_filter = admin.ModelAdmin.list_filter + ('tags', 'author')
-    list_display = admin.ModelAdmin.list_display + ('favorites_count',)
-
-    def favorites_count(self, obj):
-        return obj.users_favorites.all().count()
+    list_display = admin.ModelAdmin.list_display + (
+        'favorites_count', 'in_carts_count'
+    )
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -41,12 +40,21 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'color', 'slug')
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class RecipeCounterAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'recipe')
+        return ()
 
-class FavoriteAdmin(admin.ModelAdmin):
-    empty_value_display = '-пусто-'
+
+class ShoppingCartAdmin(RecipeCounterAdmin):
+    pass
+
+
+class FavoriteAdmin(RecipeCounterAdmin):
+    pass
 
 
 class SubscriptionsAdmin(admin.ModelAdmin):